@@ -1,23 +1,92 @@
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for, send_file
+from flask import (Flask, render_template, request, jsonify, session, redirect, url_for, send_file,
+                   Response, stream_with_context)
 import os
+import json
+import hashlib
+import sqlite3
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from functools import wraps
-from werkzeug.utils import secure_filename
+from functools import lru_cache, wraps
+from urllib.parse import quote
+from werkzeug.http import dump_options_header
+import unicodedata
 import mimetypes
-import sqlite3
+import tempfile
+from flask.json.provider import DefaultJSONProvider
+from jinja2 import FileSystemBytecodeCache
+from flask_compress import Compress
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 # Import our enhanced models and configuration
 from models import EnhancedKnowledgeBase, UserManager, EnhancedAIAssistant
-from file_manager import FileManager
+from file_manager import FileManager, safe_filename
 from config import Config
 
+
+class OrjsonProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by orjson; types orjson can't encode go through Flask's default hook"""
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=self.default, option=orjson.OPT_NON_STR_KEYS).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+
 app = Flask(__name__)
 app.config.from_object(Config)
 
+# orjson is optional; without it Flask's standard json encoder is used
+if orjson is not None:
+    app.json = OrjsonProvider(app)
+
+# Gzip the JSON and page routes marked @compress.compressed(); nothing else is touched, so a download
+# that happens to be text/html (or is handed to the web server via X-Sendfile) is never re-encoded
+compress = Compress(app)
+
+# Templates don't change in production: skip per-render mtime checks and reuse compiled bytecode across restarts
+if not Config.DEBUG:
+    jinja_cache_dir = os.path.join(tempfile.gettempdir(), 'jinja_cache')
+    os.makedirs(jinja_cache_dir, exist_ok=True)
+    app.jinja_env.auto_reload = False
+    app.jinja_env.bytecode_cache = FileSystemBytecodeCache(jinja_cache_dir)
+
+# Load the system MIME tables once at startup rather than on the first upload
+mimetypes.init()
+
+# Create necessary directories at import time so WSGI servers (gunicorn) get them too
+for directory in (Config.TEMPLATES_DIR, 'temp', 'documents'):
+    os.makedirs(directory, exist_ok=True)
+
+# Redis-backed sessions and caches, only when a Redis server is configured
+redis_client = None
+if Config.REDIS_URL:
+    import redis
+    from flask_session import Session
+
+    redis_client = redis.Redis.from_url(Config.REDIS_URL)
+    app.config['SESSION_TYPE'] = 'redis'
+    app.config['SESSION_REDIS'] = redis_client
+    Session(app)
+
+# Background upload processing, only when enabled and a Redis server is configured
+upload_queue = None
+if Config.UPLOAD_QUEUE and redis_client is not None:
+    from rq import Queue
+    from tasks import process_upload, process_bulk_upload
+
+    upload_queue = Queue('uploads', connection=redis_client)
+
 # Initialize components
-file_manager = FileManager()
+file_manager = FileManager(cache=redis_client)
 knowledge_base = EnhancedKnowledgeBase(file_manager)
-user_manager = UserManager()
+user_manager = UserManager(cache=redis_client)
 ai_assistant = EnhancedAIAssistant(knowledge_base, Config.GEMINI_API_KEY)
 
 
@@ -41,6 +110,143 @@ def admin_required(f):
     return decorated_function
 
 
+@lru_cache(maxsize=256)
+def _render_cached_page(template_name: str, username: str, name: str, role: str) -> str:
+    return render_template(template_name, user={'username': username, 'name': name, 'role': role})
+
+
+def render_page(template_name: str) -> str:
+    """Render a page that depends only on the logged-in user's name and role, cached outside debug mode"""
+    if app.debug:
+        return render_template(template_name, user={
+            'username': session['username'],
+            'name': session['name'],
+            'role': session['role']
+        })
+    return _render_cached_page(template_name, session['username'], session['name'], session['role'])
+
+
+class ZipStreamBuffer:
+    """Write-only file object that hands ZIP output back to a generator as it is produced"""
+
+    def __init__(self):
+        self._parts = []
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b''.join(self._parts)
+        self._parts.clear()
+        return data
+
+
+# Number of archive entries read from disk ahead of the one being compressed
+ZIP_READ_AHEAD = 4
+
+# Formats that are already compressed internally; deflating them again costs CPU for ~no gain
+ZIP_STORED_EXTENSIONS = frozenset({
+    '.pdf', '.docx', '.xlsx', '.pptx', '.jpg', '.jpeg', '.png', '.gif',
+    '.zip', '.gz', '.mp4', '.mp3'
+})
+
+
+def attachment_disposition(filename: str) -> str:
+    """Content-Disposition for a download, with an RFC 5987 UTF-8 name for non-ASCII filenames"""
+    ascii_name = unicodedata.normalize('NFKD', filename).encode('ascii', 'ignore').decode('ascii')
+    options = {'filename': ascii_name}
+    if ascii_name != filename:
+        options['filename*'] = f"UTF-8''{quote(filename, safe='!#$&+^`|~')}"
+    return dump_options_header('attachment', options)
+
+
+def database_snapshot(db_path: str) -> bytes:
+    """Consistent copy of a SQLite database, including commits still in its WAL file"""
+    source = sqlite3.connect(db_path)
+    snapshot = sqlite3.connect(':memory:')
+    try:
+        source.backup(snapshot)
+        return snapshot.serialize()
+    finally:
+        snapshot.close()
+        source.close()
+
+
+def read_zip_entry(zip_path, source):
+    """Load an archive entry's bytes; file entries keep their on-disk metadata"""
+    if isinstance(source, bytes):
+        return zip_path, source
+
+    zip_info = zipfile.ZipInfo.from_file(source, zip_path)
+    with open(source, 'rb') as f:
+        return zip_info, f.read()
+
+
+def stream_zip(entries):
+    """Yield a ZIP archive piece by piece from (zip path, file path or bytes) entries"""
+    buffer = ZipStreamBuffer()
+    pending = deque()
+
+    with ThreadPoolExecutor(max_workers=ZIP_READ_AHEAD) as executor, \
+            zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
+
+        def write_next():
+            # Compress the oldest entry while the pool keeps reading the next ones
+            compress_type, future = pending.popleft()
+            name, data = future.result()
+            zip_file.writestr(name, data, compress_type=compress_type, compresslevel=1)
+            return buffer.drain()
+
+        for zip_path, source in entries:
+            extension = os.path.splitext(zip_path)[1].lower()
+            compress_type = zipfile.ZIP_STORED if extension in ZIP_STORED_EXTENSIONS else zipfile.ZIP_DEFLATED
+            pending.append((compress_type, executor.submit(read_zip_entry, zip_path, source)))
+            if len(pending) >= ZIP_READ_AHEAD:
+                data = write_next()
+                if data:
+                    yield data
+
+        while pending:
+            data = write_next()
+            if data:
+                yield data
+
+    # Central directory is written when the archive is closed
+    yield buffer.drain()
+
+
+def zip_response(entries, download_name: str) -> Response:
+    """Stream a ZIP archive to the client as an attachment"""
+    return Response(
+        stream_with_context(stream_zip(entries)),
+        mimetype='application/zip',
+        headers={'Content-Disposition': f'attachment; filename="{download_name}"'}
+    )
+
+
+def files_etag(*parts) -> str:
+    """ETag for responses derived from the files table at its current version"""
+    return '-'.join(['files', str(file_manager.get_files_version())] + [str(part) for part in parts])
+
+
+def conditional_json(etag: str, build):
+    """Answer 304 if the client already has this ETag, otherwise build the JSON response"""
+    # Flask-Compress sends compressed bodies as "<etag>:gzip"; either form means the client is current
+    client_tags = request.if_none_match
+    if client_tags.contains(etag) or any(tag.startswith(f'{etag}:') for tag in client_tags.as_set()):
+        response = Response(status=304)
+    else:
+        response = jsonify(build())
+    response.set_etag(etag)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+
 @app.route('/')
 def index():
     if 'user_id' in session:
@@ -49,6 +255,7 @@ def index():
 
 
 @app.route('/login', methods=['GET', 'POST'])
+@compress.compressed()
 def login():
     if request.method == 'POST':
         data = request.json
@@ -88,19 +295,10 @@ def signup():
 
 
 @app.route('/dashboard')
+@compress.compressed()
 @login_required
 def dashboard():
-    user_info = {
-        'id': session['user_id'],
-        'username': session['username'],
-        'name': session['name'],
-        'role': session['role']
-    }
-
-    # Get recent documents for dashboard
-    recent_files = file_manager.list_files()[:5]  # Last 5 files
-
-    return render_template('dashboard.html', user=user_info, recent_files=recent_files)
+    return render_page('dashboard.html')
 
 
 @app.route('/chat', methods=['POST'])
@@ -137,6 +335,38 @@ def chat():
         }), 500
 
 
+@app.route('/chat/stream', methods=['POST'])
+@login_required
+def chat_stream():
+    """Stream the AI response as plain text while it is being generated"""
+    try:
+        data = request.get_json(silent=True) or {}
+        message = data.get('message', '').strip()
+
+        if not message:
+            return jsonify({'error': 'Boş mesaj göndərilə bilməz'}), 400
+
+        user_info = {
+            'id': session['user_id'],
+            'username': session['username'],
+            'name': session['name'],
+            'role': session['role']
+        }
+
+        return Response(
+            ai_assistant.generate_enhanced_response_stream(message, user_info),
+            mimetype='text/plain',
+            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+        )
+
+    except Exception as e:
+        print(f"Chat error: {e}")
+        return jsonify({
+            'success': False,
+            'error': 'Texniki problem yarandı. Zəhmət olmasa yenidən cəhd edin.'
+        }), 500
+
+
 @app.route('/upload', methods=['POST'])
 @login_required
 def upload_file():
@@ -154,28 +384,35 @@ def upload_file():
         description = request.form.get('description', '')
         tags = request.form.get('tags', '').split(',') if request.form.get('tags') else []
 
-        # Save file temporarily
-        filename = secure_filename(file.filename)
-        temp_path = os.path.join('temp', filename)
-        os.makedirs('temp', exist_ok=True)
-        file.save(temp_path)
+        filename = safe_filename(file.filename)
 
-        # Process with file manager
-        result = file_manager.upload_file(
-            temp_path,
+        # With a worker queue, only the bytes are written here; extraction happens out of band
+        if upload_queue is not None:
+            stored = file_manager.store_stream(file.stream, filename)
+            job = upload_queue.enqueue(process_upload, stored, category, tags, description)
+            return jsonify({
+                'success': True,
+                'message': f'{filename} qəbul edildi, emal olunur',
+                'job_id': job.id
+            }), 202
+
+        # Stream the upload straight into document storage
+        result = file_manager.upload_stream(
+            file.stream,
+            filename,
             category=category,
             tags=tags,
             description=description
         )
 
-        # Clean up temp file
-        if os.path.exists(temp_path):
-            os.remove(temp_path)
-
         if result.get('success'):
+            if result.get('duplicate'):
+                message = f'{filename} artıq yüklənib ({result["filename"]})'
+            else:
+                message = f'{filename} uğurla yükləndi'
             return jsonify({
                 'success': True,
-                'message': f'{filename} uğurla yükləndi',
+                'message': message,
                 'file_info': result
             })
         else:
@@ -192,17 +429,36 @@ def upload_file():
         }), 500
 
 
+@app.route('/upload-status/<job_id>')
+@compress.compressed()
+@login_required
+def upload_status(job_id):
+    """Report the state of a queued upload job"""
+    job = upload_queue.fetch_job(job_id) if upload_queue is not None else None
+    if job is None:
+        return jsonify({'success': False, 'error': 'Tapşırıq tapılmadı'}), 404
+
+    return jsonify({
+        'success': True,
+        'status': job.get_status(),
+        'result': job.return_value()
+    })
+
+
 @app.route('/files')
+@compress.compressed()
 @login_required
 def list_files():
     """List all uploaded files"""
     try:
         category = request.args.get('category')
-        files = file_manager.list_files(category=category)
+        # Categories can hold non-latin-1 text or quotes, which aren't valid in a header; hash them
+        category_tag = hashlib.blake2b(category.encode(), digest_size=8).hexdigest() if category else '*'
+        etag = files_etag('list', category_tag)
 
-        return jsonify({
+        return conditional_json(etag, lambda: {
             'success': True,
-            'files': files
+            'files': file_manager.list_files(category=category)
         })
     except Exception as e:
         print(f"List files error: {e}")
@@ -213,6 +469,7 @@ def list_files():
 
 
 @app.route('/files/<file_id>')
+@compress.compressed()
 @login_required
 def get_file_content(file_id):
     """Get file content by ID"""
@@ -236,6 +493,7 @@ def get_file_content(file_id):
 
 
 @app.route('/search-files')
+@compress.compressed()
 @login_required
 def search_files():
     """Search through uploaded files"""
@@ -276,6 +534,13 @@ def bulk_upload():
         if not os.path.exists(directory_path):
             return jsonify({'error': 'Directory tapılmadı'}), 400
 
+        if upload_queue is not None:
+            job = upload_queue.enqueue(process_bulk_upload, directory_path, category, job_timeout=3600)
+            return jsonify({
+                'success': True,
+                'job_id': job.id
+            }), 202
+
         result = file_manager.bulk_upload(directory_path, category=category)
 
         return jsonify({
@@ -291,34 +556,14 @@ def bulk_upload():
 
 
 @app.route('/file-stats')
+@compress.compressed()
 @login_required
 def file_stats():
     """Get file statistics"""
     try:
-        files = file_manager.list_files()
-
-        stats = {
-            'total_files': len(files),
-            'file_types': {},
-            'categories': {},
-            'total_size': 0
-        }
-
-        for file_info in files:
-            # Count by file type
-            file_type = file_info['file_type']
-            stats['file_types'][file_type] = stats['file_types'].get(file_type, 0) + 1
-
-            # Count by category
-            category = file_info.get('category', 'Uncategorized')
-            stats['categories'][category] = stats['categories'].get(category, 0) + 1
-
-            # Sum file sizes
-            stats['total_size'] += file_info.get('file_size', 0)
-
-        return jsonify({
+        return conditional_json(files_etag('stats'), lambda: {
             'success': True,
-            'stats': stats
+            'stats': file_manager.get_stats()
         })
     except Exception as e:
         print(f"Stats error: {e}")
@@ -335,6 +580,7 @@ def logout():
 
 
 @app.route('/api/knowledge-search')
+@compress.compressed()
 @login_required
 def knowledge_search():
     """Enhanced knowledge search including documents"""
@@ -359,16 +605,11 @@ def knowledge_search():
 
 
 @app.route('/documents')
+@compress.compressed()
 @login_required
 def documents_page():
     """Documents management page"""
-    user_info = {
-        'id': session['user_id'],
-        'username': session['username'],
-        'name': session['name'],
-        'role': session['role']
-    }
-    return render_template('documents.html', user=user_info)
+    return render_page('documents.html')
 
 
 # Add these routes to your existing app.py file
@@ -379,32 +620,39 @@ def download_file(file_id):
     """Download a file by its ID"""
     try:
         # Get file info from database
-        conn = sqlite3.connect(file_manager.db_path)
-        cursor = conn.cursor()
-        cursor.execute('''
-                       SELECT filename, file_path, file_type
-                       FROM files
-                       WHERE id = ?
-                       ''', (file_id,))
-
-        file_info = cursor.fetchone()
-        conn.close()
+        with file_manager.get_conn() as conn:
+            file_info = conn.execute('''
+                                     SELECT filename, file_path, mime_type
+                                     FROM files
+                                     WHERE id = ?
+                                     ''', (file_id,)).fetchone()
 
         if not file_info:
             return jsonify({'error': 'File not found'}), 404
 
-        filename, file_path, file_type = file_info
+        filename, file_path, mime_type = file_info
 
         # Check if file exists
         if not os.path.exists(file_path):
             return jsonify({'error': 'Physical file not found'}), 404
 
-        # Send file
+        # Let nginx stream the bytes from its internal location; access was checked above
+        if Config.X_ACCEL_REDIRECT_PREFIX:
+            relative_path = os.path.relpath(file_path, file_manager.storage_dir).replace(os.sep, '/')
+            return Response(
+                mimetype=mime_type or 'application/octet-stream',
+                headers={
+                    'X-Accel-Redirect': f"{Config.X_ACCEL_REDIRECT_PREFIX.rstrip('/')}/{quote(relative_path)}",
+                    'Content-Disposition': attachment_disposition(filename)
+                }
+            )
+
+        # Send file (handed to the web server via X-Sendfile when USE_X_SENDFILE is on)
         return send_file(
             file_path,
             as_attachment=True,
             download_name=filename,
-            mimetype=mimetypes.guess_type(filename)[0]
+            mimetype=mime_type
         )
 
     except Exception as e:
@@ -417,40 +665,22 @@ def download_file(file_id):
 def download_all_files():
     """Download all files as ZIP (Admin only)"""
     try:
-        import zipfile
-        from io import BytesIO
-
-        # Create ZIP in memory
-        zip_buffer = BytesIO()
-
-        with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-            # Get all files
-            files = file_manager.list_files()
+        # The listing usually comes from the cache; storage paths are batch-fetched by id
+        files = file_manager.list_files()
+        paths = file_manager.get_file_paths([file_info['file_id'] for file_info in files])
 
+        def entries():
             for file_info in files:
-                file_path = None
-
-                # Get file path from database
-                conn = sqlite3.connect(file_manager.db_path)
-                cursor = conn.cursor()
-                cursor.execute('SELECT file_path FROM files WHERE id = ?', (file_info['file_id'],))
-                result = cursor.fetchone()
-                conn.close()
+                file_path = paths.get(file_info['file_id'])
 
-                if result and os.path.exists(result[0]):
-                    file_path = result[0]
+                if file_path and os.path.exists(file_path):
                     # Add file to ZIP with category folder structure
                     category = file_info.get('category', 'Uncategorized')
-                    zip_path = f"{category}/{file_info['filename']}"
-                    zip_file.write(file_path, zip_path)
+                    yield f"{category}/{file_info['filename']}", file_path
 
-        zip_buffer.seek(0)
-
-        return send_file(
-            BytesIO(zip_buffer.read()),
-            mimetype='application/zip',
-            as_attachment=True,
-            download_name=f'nazirlik_documents_{datetime.now().strftime("%Y%m%d")}.zip'
+        return zip_response(
+            entries(),
+            f'nazirlik_documents_{datetime.now().strftime("%Y%m%d")}.zip'
         )
 
     except Exception as e:
@@ -459,37 +689,41 @@ def download_all_files():
 
 
 @app.route('/files/<file_id>/info')
+@compress.compressed()
 @login_required
 def get_file_info(file_id):
     """Get detailed file information"""
     try:
-        conn = sqlite3.connect(file_manager.db_path)
-        cursor = conn.cursor()
-
-        cursor.execute('''
-                       SELECT f.*, COUNT(c.id) as chunk_count
-                       FROM files f
-                                LEFT JOIN chunks c ON f.id = c.file_id
-                       WHERE f.id = ?
-                       GROUP BY f.id
-                       ''', (file_id,))
-
-        file_data = cursor.fetchone()
-        conn.close()
+        with file_manager.get_conn() as conn:
+            file_data = conn.execute('''
+                                     SELECT f.id,
+                                            f.filename,
+                                            f.original_name,
+                                            f.file_type,
+                                            f.file_size,
+                                            f.upload_date,
+                                            f.category,
+                                            f.description,
+                                            COUNT(c.id) AS chunk_count
+                                     FROM files f
+                                              LEFT JOIN chunks c ON f.id = c.file_id
+                                     WHERE f.id = ?
+                                     GROUP BY f.id
+                                     ''', (file_id,)).fetchone()
 
         if not file_data:
             return jsonify({'error': 'File not found'}), 404
 
         file_info = {
-            'file_id': file_data[0],
-            'filename': file_data[1],
-            'original_name': file_data[2],
-            'file_type': file_data[4],
-            'file_size': file_data[5],
-            'upload_date': file_data[7],
-            'category': file_data[9],
-            'description': file_data[11],
-            'chunk_count': file_data[14],
+            'file_id': file_data['id'],
+            'filename': file_data['filename'],
+            'original_name': file_data['original_name'],
+            'file_type': file_data['file_type'],
+            'file_size': file_data['file_size'],
+            'upload_date': file_data['upload_date'],
+            'category': file_data['category'],
+            'description': file_data['description'],
+            'chunk_count': file_data['chunk_count'],
             'download_url': url_for('download_file', file_id=file_id)
         }
 
@@ -508,33 +742,23 @@ def get_file_info(file_id):
 def export_data():
     """Export all data including files and database (Admin only)"""
     try:
-        import zipfile
-        from io import BytesIO
-        import json
-
-        zip_buffer = BytesIO()
-
-        with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
+        files = file_manager.list_files_with_paths()
 
+        def entries():
             # 1. Add all documents
-            files = file_manager.list_files()
             for file_info in files:
-                conn = sqlite3.connect(file_manager.db_path)
-                cursor = conn.cursor()
-                cursor.execute('SELECT file_path FROM files WHERE id = ?', (file_info['file_id'],))
-                result = cursor.fetchone()
-                conn.close()
+                # Storage paths stay out of the exported metadata
+                file_path = file_info.pop('file_path')
 
-                if result and os.path.exists(result[0]):
+                if os.path.exists(file_path):
                     category = file_info.get('category', 'Uncategorized')
-                    zip_path = f"documents/{category}/{file_info['filename']}"
-                    zip_file.write(result[0], zip_path)
+                    yield f"documents/{category}/{file_info['filename']}", file_path
 
-            # 2. Add databases
+            # 2. Add databases (snapshots, the raw files can lag behind their WAL)
             if os.path.exists('users.db'):
-                zip_file.write('users.db', 'database/users.db')
+                yield 'database/users.db', database_snapshot('users.db')
             if os.path.exists('file_index.db'):
-                zip_file.write('file_index.db', 'database/file_index.db')
+                yield 'database/file_index.db', database_snapshot(file_manager.db_path)
 
             # 3. Add file metadata as JSON
             metadata = {
@@ -542,15 +766,11 @@ def export_data():
                 'total_files': len(files),
                 'files': files
             }
-            zip_file.writestr('metadata.json', json.dumps(metadata, ensure_ascii=False, indent=2))
-
-        zip_buffer.seek(0)
+            yield 'metadata.json', json.dumps(metadata, ensure_ascii=False, indent=2).encode('utf-8')
 
-        return send_file(
-            BytesIO(zip_buffer.read()),
-            mimetype='application/zip',
-            as_attachment=True,
-            download_name=f'nazirlik_full_export_{datetime.now().strftime("%Y%m%d_%H%M")}.zip'
+        return zip_response(
+            entries(),
+            f'nazirlik_full_export_{datetime.now().strftime("%Y%m%d_%H%M")}.zip'
         )
 
     except Exception as e:
@@ -558,23 +778,13 @@ def export_data():
         return jsonify({'error': 'Export failed'}), 500
 
 @app.route('/files-manager')
+@compress.compressed()
 @login_required
 def files_manager():
     """File management page"""
-    user_info = {
-        'id': session['user_id'],
-        'username': session['username'],
-        'name': session['name'],
-        'role': session['role']
-    }
-    return render_template('files.html', user=user_info)
+    return render_page('files.html')
 
 if __name__ == '__main__':
-    # Create necessary directories
-    os.makedirs(Config.TEMPLATES_DIR, exist_ok=True)
-    os.makedirs('temp', exist_ok=True)
-    os.makedirs('documents', exist_ok=True)
-
     print("🚀 Enhanced AI Onboarding System Starting...")
     print("📧 Demo Accounts:")
     print("   Admin: admin / admin123")
@@ -585,4 +795,8 @@ if __name__ == '__main__':
     print("🔍 Document Search: Ready")
     print(f"🌐 Server: http://{Config.HOST}:{Config.PORT}")
 
-    app.run(debug=Config.DEBUG, host=Config.HOST, port=Config.PORT)
\ No newline at end of file
+    if Config.DEBUG:
+        app.run(debug=True, host=Config.HOST, port=Config.PORT)
+    else:
+        from waitress import serve
+        serve(app, host=Config.HOST, port=Config.PORT, threads=16)
\ No newline at end of file
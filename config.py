@@ -14,6 +14,12 @@ class Config:
 
     # Session configuration
     PERMANENT_SESSION_LIFETIME = timedelta(hours=24)
+    SESSION_PERMANENT = True
+
+    # Redis configuration - optional, enables server-side sessions and shared caches
+    REDIS_URL = os.environ.get('REDIS_URL')
+    # Hand upload processing to an RQ worker ("rq worker uploads -w rq.SimpleWorker"); needs REDIS_URL and rq
+    UPLOAD_QUEUE = os.environ.get('UPLOAD_QUEUE', 'False').lower() == 'true'
 
     # Debug mode - False for production
     DEBUG = os.environ.get('FLASK_DEBUG', 'False').lower() == 'true'
@@ -22,5 +28,16 @@ class Config:
     HOST = os.environ.get('FLASK_HOST', '0.0.0.0')
     PORT = int(os.environ.get('PORT', os.environ.get('FLASK_PORT', 5000)))
 
+    # Download offloading to a reverse proxy - both off by default
+    # USE_X_SENDFILE: Apache (mod_xsendfile) / lighttpd serve files named in X-Sendfile
+    USE_X_SENDFILE = os.environ.get('USE_X_SENDFILE', 'False').lower() == 'true'
+    # X_ACCEL_REDIRECT_PREFIX: nginx internal location aliased to the documents directory
+    X_ACCEL_REDIRECT_PREFIX = os.environ.get('X_ACCEL_REDIRECT_PREFIX')
+
+    # Response compression (Flask-Compress), only on routes marked @compress.compressed()
+    COMPRESS_REGISTER = False
+    COMPRESS_MIMETYPES = ['application/json', 'text/html']
+    COMPRESS_MIN_SIZE = 1024
+
     # Templates directory
     TEMPLATES_DIR = 'templates'
\ No newline at end of file
@@ -1,8 +1,17 @@
 import os
+import re
+import codecs
 import json
 import hashlib
 import sqlite3
-from datetime import datetime
+import shutil
+import queue
+import secrets
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from functools import wraps
 from pathlib import Path
 import mimetypes
 import logging
@@ -13,17 +22,46 @@ try:
     import PyPDF2
     import docx
     import openpyxl
-    from bs4 import BeautifulSoup
+    import lxml.html
     import markdown
+
+    # Parsed as bytes so XHTML encoding declarations are accepted
+    _HTML_PARSER = lxml.html.HTMLParser(encoding='utf-8')
 except ImportError:
     print("Warning: Some document processing libraries are not installed.")
-    print("Install with: pip install PyPDF2 python-docx openpyxl beautifulsoup4 markdown")
+    print("Install with: pip install PyPDF2 python-docx openpyxl lxml markdown")
+
+# Native PDFium text extraction is much faster than PyPDF2, which remains the fallback
+try:
+    import pypdfium2 as pdfium
+except ImportError:
+    pdfium = None
+
+# PDFium is not thread-safe, and waitress extracts uploads on several request threads
+_PDFIUM_LOCK = threading.Lock()
+
+
+def _reset_pdfium_lock():
+    # A forked pool worker may inherit the lock while another thread holds it
+    global _PDFIUM_LOCK
+    _PDFIUM_LOCK = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_pdfium_lock)
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
+# Byte order marks recognised in plain text files, checked in order
+_TEXT_BOMS = (
+    (codecs.BOM_UTF8, 'utf-8'),
+    (codecs.BOM_UTF16_LE, 'utf-16-le'),
+    (codecs.BOM_UTF16_BE, 'utf-16-be'),
+)
+
+
 class DocumentProcessor:
     """Handles different document types and extracts text content"""
 
@@ -31,12 +69,23 @@ class DocumentProcessor:
     def extract_text_from_pdf(file_path: str) -> str:
         """Extract text from PDF files"""
         try:
+            if pdfium is not None:
+                with _PDFIUM_LOCK:
+                    pdf = pdfium.PdfDocument(file_path)
+                    try:
+                        pages = []
+                        for page in pdf:
+                            text_page = page.get_textpage()
+                            pages.append(text_page.get_text_range() + "\n")
+                            text_page.close()
+                            page.close()
+                        return "".join(pages)
+                    finally:
+                        pdf.close()
+
             with open(file_path, 'rb') as file:
                 pdf_reader = PyPDF2.PdfReader(file)
-                text = ""
-                for page in pdf_reader.pages:
-                    text += page.extract_text() + "\n"
-                return text
+                return "".join([page.extract_text() + "\n" for page in pdf_reader.pages])
         except Exception as e:
             logger.error(f"Error processing PDF {file_path}: {e}")
             return ""
@@ -46,10 +95,7 @@ class DocumentProcessor:
         """Extract text from DOCX files"""
         try:
             doc = docx.Document(file_path)
-            text = ""
-            for paragraph in doc.paragraphs:
-                text += paragraph.text + "\n"
-            return text
+            return "".join([paragraph.text + "\n" for paragraph in doc.paragraphs])
         except Exception as e:
             logger.error(f"Error processing DOCX {file_path}: {e}")
             return ""
@@ -58,59 +104,108 @@ class DocumentProcessor:
     def extract_text_from_excel(file_path: str) -> str:
         """Extract text from Excel files"""
         try:
-            workbook = openpyxl.load_workbook(file_path, data_only=True)
-            text = ""
-            for sheet_name in workbook.sheetnames:
-                sheet = workbook[sheet_name]
-                text += f"Sheet: {sheet_name}\n"
-                for row in sheet.iter_rows(values_only=True):
-                    row_text = " | ".join([str(cell) if cell is not None else "" for cell in row])
-                    if row_text.strip():
-                        text += row_text + "\n"
-                text += "\n"
-            return text
+            # Read-only mode streams rows as plain values instead of building a Cell per cell
+            workbook = openpyxl.load_workbook(file_path, data_only=True, read_only=True)
+            try:
+                parts = []
+                append = parts.append
+                for sheet_name in workbook.sheetnames:
+                    sheet = workbook[sheet_name]
+                    append(f"Sheet: {sheet_name}\n")
+                    for row in sheet.iter_rows(values_only=True):
+                        if all(cell is None for cell in row):
+                            continue
+                        row_text = " | ".join(["" if cell is None else str(cell) for cell in row])
+                        if row_text.strip():
+                            append(row_text)
+                            append("\n")
+                    append("\n")
+                return "".join(parts)
+            finally:
+                workbook.close()
         except Exception as e:
             logger.error(f"Error processing Excel {file_path}: {e}")
             return ""
 
     @staticmethod
     def extract_text_from_txt(file_path: str) -> str:
-        """Extract text from plain text files"""
+        """Extract text from plain text files (read once; BOM, then utf-8, then cp1251)"""
+        data = Path(file_path).read_bytes()
         try:
-            with open(file_path, 'r', encoding='utf-8') as file:
-                return file.read()
-        except UnicodeDecodeError:
-            try:
-                with open(file_path, 'r', encoding='cp1251') as file:
-                    return file.read()
-            except Exception as e:
-                logger.error(f"Error processing TXT {file_path}: {e}")
-                return ""
+            for bom, encoding in _TEXT_BOMS:
+                if data.startswith(bom):
+                    text = data[len(bom):].decode(encoding)
+                    break
+            else:
+                try:
+                    text = data.decode('utf-8')
+                except UnicodeDecodeError:
+                    # Strict, so binary files (.doc, unknown types) aren't indexed as mojibake;
+                    # NUL never occurs in cp1251 text
+                    if b'\0' in data:
+                        raise ValueError("binary content")
+                    text = data.decode('cp1251')
+        except (UnicodeDecodeError, ValueError) as e:
+            logger.error(f"Error processing TXT {file_path}: {e}")
+            return ""
+        # Same newlines as reading the file in text mode
+        return text.replace('\r\n', '\n').replace('\r', '\n')
 
     @staticmethod
-    def extract_text_from_html(file_path: str) -> str:
+    def html_text(root) -> str:
+        """Text of a parsed HTML tree without script and style contents"""
+        for element in list(root.iter('script', 'style')):
+            element.drop_tree()
+        return root.text_content()
+
+    @classmethod
+    def extract_text_from_html(cls, file_path: str) -> str:
         """Extract text from HTML files"""
         try:
-            with open(file_path, 'r', encoding='utf-8') as file:
-                soup = BeautifulSoup(file.read(), 'html.parser')
-                return soup.get_text()
+            with open(file_path, 'rb') as file:
+                data = file.read()
+            if not data.strip():
+                return ""
+            return cls.html_text(lxml.html.document_fromstring(data, parser=_HTML_PARSER))
         except Exception as e:
             logger.error(f"Error processing HTML {file_path}: {e}")
             return ""
 
-    @staticmethod
-    def extract_text_from_md(file_path: str) -> str:
+    @classmethod
+    def extract_text_from_md(cls, file_path: str) -> str:
         """Extract text from Markdown files"""
         try:
             with open(file_path, 'r', encoding='utf-8') as file:
                 md_content = file.read()
                 html = markdown.markdown(md_content)
-                soup = BeautifulSoup(html, 'html.parser')
-                return soup.get_text()
+                return cls.html_text(lxml.html.fragment_fromstring(html, create_parent='div'))
         except Exception as e:
             logger.error(f"Error processing Markdown {file_path}: {e}")
             return ""
 
+    @classmethod
+    def extract(cls, file_path: str, file_type: str) -> str:
+        """Extract text content based on file type"""
+        extractors = {
+            'pdf': cls.extract_text_from_pdf,
+            'docx': cls.extract_text_from_docx,
+            'excel': cls.extract_text_from_excel,
+            'text': cls.extract_text_from_txt,
+            'html': cls.extract_text_from_html,
+            'markdown': cls.extract_text_from_md
+        }
+
+        extractor = extractors.get(file_type, cls.extract_text_from_txt)
+        return extractor(file_path)
+
+
+def _extract_worker(file_path: str, file_type: str) -> str:
+    """Text extraction entry point for worker processes"""
+    return DocumentProcessor.extract(file_path, file_type)
+
+
+_WORD_RE = re.compile(r'\S+')
+
 
 class DocumentChunker:
     """Handles chunking of large documents for better processing"""
@@ -120,11 +215,12 @@ class DocumentChunker:
         self.overlap_size = overlap_size
 
     def chunk_text(self, text: str, document_id: str) -> List[Dict]:
-        """Split text into overlapping chunks"""
-        chunks = []
-        words = text.split()
+        """Split text into overlapping chunks of words, sliced straight out of the original text"""
+        # Word boundaries are found once; each chunk is then a single slice of the text
+        spans = [match.span() for match in _WORD_RE.finditer(text)]
+        word_count = len(spans)
 
-        if len(words) <= self.max_chunk_size:
+        if word_count <= self.max_chunk_size:
             return [{
                 'chunk_id': f"{document_id}_chunk_0",
                 'content': text,
@@ -132,40 +228,324 @@ class DocumentChunker:
                 'total_chunks': 1
             }]
 
-        total_chunks = (len(words) + self.max_chunk_size - 1) // self.max_chunk_size
-
-        for i in range(0, len(words), self.max_chunk_size - self.overlap_size):
-            chunk_words = words[i:i + self.max_chunk_size]
-            chunk_text = ' '.join(chunk_words)
+        # Chunks start every `step` words; the last one is the first to reach the end of the text
+        step = self.max_chunk_size - self.overlap_size
+        total_chunks = 1 + (word_count - self.max_chunk_size + step - 1) // step
 
+        chunks = []
+        for chunk_index in range(total_chunks):
+            first_word = chunk_index * step
+            last_word = min(first_word + self.max_chunk_size, word_count) - 1
             chunks.append({
-                'chunk_id': f"{document_id}_chunk_{len(chunks)}",
-                'content': chunk_text,
-                'chunk_index': len(chunks),
+                'chunk_id': f"{document_id}_chunk_{chunk_index}",
+                'content': text[spans[first_word][0]:spans[last_word][1]],
+                'chunk_index': chunk_index,
                 'total_chunks': total_chunks
             })
 
-            if i + self.max_chunk_size >= len(words):
-                break
-
         return chunks
 
 
+# Uploaded streams are copied to storage in blocks of this size
+UPLOAD_BLOCK_SIZE = 1024 * 1024
+
+_UNSAFE_FILENAME_RE = re.compile(r'[^A-Za-z0-9_.\-]+')
+
+
+def safe_filename(name: str, default: str = 'file') -> str:
+    """Reduce a filename to a safe ASCII form for storage (cheaper than werkzeug's secure_filename)"""
+    return _UNSAFE_FILENAME_RE.sub('_', name.strip()).strip('._') or default
+
+
+# Length of the stored chunk preview; longer chunks are cut and marked with PREVIEW_SUFFIX
+PREVIEW_LENGTH = 200
+PREVIEW_SUFFIX = "..."
+
+
+def preview_text(content: str) -> str:
+    """Chunk preview, with the suffix only when something was actually cut off"""
+    if len(content) <= PREVIEW_LENGTH:
+        return content
+    return content[:PREVIEW_LENGTH] + PREVIEW_SUFFIX
+
+
+def new_content_hasher():
+    """Hasher for files.content_hash; every upload path must use it so duplicates are detected"""
+    return hashlib.blake2b(digest_size=32)
+
+
+# File extension -> file type used for extraction
+_EXT_TYPE = {
+    '.pdf': 'pdf',
+    '.docx': 'docx',
+    '.doc': 'doc',
+    '.xlsx': 'excel',
+    '.xls': 'excel',
+    '.txt': 'text',
+    '.md': 'markdown',
+    '.html': 'html',
+    '.htm': 'html',
+    '.json': 'json',
+    '.xml': 'xml'
+}
+
+# FTS5 query cleanup: operator characters are dropped, hyphens split words
+_FTS_QUERY_TRANSLATION = str.maketrans({
+    **dict.fromkeys('"\'?()[]{}*+'),
+    '-': ' '
+})
+
+# bm25 weights for file_search columns: file_id, filename, content, category, tags
+FTS_COLUMN_WEIGHTS = '0.0, 1.0, 10.0, 2.0, 2.0'
+
+# Queries containing these are answered by the LIKE search instead of FTS5
+_AZERBAIJANI_CHARS = frozenset('əıöüğşç')
+_QUERY_SPECIAL_CHARS = frozenset('"\'?()[]')
+
+# Ids per "WHERE id IN (...)" query, well under SQLite's bound-variable limit
+SQL_IN_BATCH_SIZE = 500
+
+# Seconds a cached file listing stays valid; uploads invalidate it sooner
+FILE_LIST_CACHE_TTL = 300
+
+
+def cached_file_list(method):
+    """Serve a file listing from the cache, keyed by the current file list version"""
+
+    @wraps(method)
+    def wrapper(self, category: str = None):
+        if self.cache is None:
+            return method(self, category)
+
+        version = self.get_files_version()
+        cache_key = f"files:list:{version}:{category or '*'}"
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            return json.loads(cached)
+
+        files = method(self, category)
+        self.cache.setex(cache_key, FILE_LIST_CACHE_TTL, json.dumps(files, ensure_ascii=False))
+        return files
+
+    return wrapper
+
+
+# Applied to every connection: WAL lets readers run alongside a writer, and with it
+# synchronous=NORMAL only syncs at checkpoints; 64 MB page cache, 256 MB memory map
+CONNECTION_PRAGMAS = (
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA temp_store=MEMORY',
+    'PRAGMA mmap_size=268435456',
+    'PRAGMA cache_size=-65536',
+)
+
+# Page size for newly created databases; it can't change once a database is in WAL mode
+NEW_DATABASE_PAGE_SIZE = 8192
+
+# Prepared-statement cache per connection; sqlite3 keys it on the exact SQL text, so the
+# statements below are module constants shared by every call
+STATEMENT_CACHE_SIZE = 128
+
+_SQL_FILES_VERSION = 'SELECT version FROM files_version WHERE id = 1'
+_SQL_BUMP_FILES_VERSION = 'UPDATE files_version SET version = version + 1 WHERE id = 1'
+
+_SQL_FIND_BY_HASH = 'SELECT id, filename, file_type, chunk_count FROM files WHERE content_hash = ?'
+
+_SQL_INSERT_FILE = '''
+    INSERT INTO files (id, filename, original_name, file_path, file_type,
+                       file_size, content_hash, category, tags, description,
+                       processed, chunk_count, mime_type)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+_SQL_INSERT_CHUNK = '''
+    INSERT INTO chunks (id, file_id, chunk_index, content, content_preview)
+    VALUES (?, ?, ?, ?, ?)
+'''
+_SQL_INSERT_SEARCH_ROW = '''
+    INSERT INTO file_search (file_id, filename, content, category, tags)
+    VALUES (?, ?, ?, ?, ?)
+'''
+
+# Search bases; optional category / file type filters and the ordering are appended
+_SQL_SEARCH_LIKE = '''
+    SELECT DISTINCT f.id, f.filename, f.file_type, f.category, f.description,
+                    f.chunk_count, SUBSTR(c.content, 1, 300) as snippet
+    FROM files f
+             JOIN chunks c ON f.id = c.file_id
+    WHERE (c.content LIKE ? OR f.filename LIKE ? OR f.description LIKE ?)
+'''
+# One search row per file, so no DISTINCT is needed
+_SQL_SEARCH_FTS = '''
+    SELECT f.id, f.filename, f.file_type, f.category, f.description, f.chunk_count,
+           snippet(file_search, 2, '<mark>', '</mark>', '...', 32) as snippet
+    FROM file_search fs
+             JOIN files f ON f.id = fs.file_id
+    WHERE file_search MATCH ?
+'''
+
+_SQL_CHUNK_CONTENT = 'SELECT content FROM chunks WHERE file_id = ? AND chunk_index = ?'
+_SQL_FILE_CONTENT = 'SELECT content FROM chunks WHERE file_id = ? ORDER BY chunk_index'
+_SQL_FILE_INFO = 'SELECT filename, file_type, category, description, chunk_count FROM files WHERE id = ?'
+
+# Batched forms; the IN (...) placeholders are filled in per batch
+_SQL_FILES_INFO_IN = 'SELECT id, filename, file_type, category, description, chunk_count FROM files WHERE id IN ({})'
+_SQL_FILE_PATHS_IN = 'SELECT id, file_path FROM files WHERE id IN ({})'
+_SQL_FILES_CONTENT_IN = 'SELECT file_id, content FROM chunks WHERE file_id IN ({}) ORDER BY file_id, chunk_index'
+
+_SQL_LIST_FILES = '''
+    SELECT id, filename, file_type, file_size, category, description, upload_date, chunk_count
+    FROM files
+    ORDER BY upload_date DESC
+'''
+_SQL_LIST_FILES_IN_CATEGORY = '''
+    SELECT id, filename, file_type, file_size, category, description, upload_date, chunk_count
+    FROM files
+    WHERE category = ?
+    ORDER BY upload_date DESC
+'''
+_SQL_LIST_FILES_WITH_PATHS = '''
+    SELECT id, filename, file_type, file_size, category, description, upload_date, chunk_count, file_path
+    FROM files
+    ORDER BY upload_date DESC
+'''
+# Case-insensitive substring match on the file name (ASCII case folding, as SQLite's LIKE does)
+_SQL_FIND_BY_FILENAME = '''
+    SELECT id, filename, file_type, category, upload_date
+    FROM files
+    WHERE filename LIKE ? ESCAPE '\\'
+    ORDER BY upload_date DESC
+    LIMIT ?
+'''
+
+_SQL_STATS_TOTALS = 'SELECT COUNT(*), COALESCE(SUM(file_size), 0) FROM files'
+_SQL_STATS_BY_TYPE = 'SELECT file_type, COUNT(*) FROM files GROUP BY file_type'
+_SQL_STATS_BY_CATEGORY = 'SELECT category, COUNT(*) FROM files GROUP BY category'
+
+
+def _configure_connection(conn: sqlite3.Connection) -> sqlite3.Connection:
+    """Apply the standard PRAGMAs to a new connection"""
+    for pragma in CONNECTION_PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+class ConnectionPool:
+    """Keeps a small set of warm SQLite connections that can be shared across requests"""
+
+    def __init__(self, db_path: str, size: int = 4):
+        self.db_path = db_path
+        self.size = size
+        self._idle = queue.Queue()
+        self._opened = 0
+        self._lock = threading.Lock()
+
+    def _open(self) -> sqlite3.Connection:
+        """Open a new connection with the pool's PRAGMAs applied"""
+        conn = sqlite3.connect(self.db_path, check_same_thread=False, cached_statements=STATEMENT_CACHE_SIZE)
+        conn.row_factory = sqlite3.Row
+        return _configure_connection(conn)
+
+    def _acquire(self) -> sqlite3.Connection:
+        """Take an idle connection, opening a new one lazily while under the pool size"""
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            can_open = self._opened < self.size
+            if can_open:
+                self._opened += 1
+
+        if not can_open:
+            return self._idle.get()
+
+        try:
+            return self._open()
+        except Exception:
+            with self._lock:
+                self._opened -= 1
+            raise
+
+    @contextmanager
+    def connection(self):
+        """Check a connection out of the pool; commits on success, rolls back on error"""
+        conn = self._acquire()
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self._idle.put(conn)
+
+
+# Extracted texts kept in memory, keyed by (content_hash, file_type)
+EXTRACTED_TEXT_CACHE_SIZE = 64
+
+
+class ExtractedTextCache:
+    """Thread-safe LRU of extracted document texts that are not indexed yet"""
+
+    def __init__(self, size: int = EXTRACTED_TEXT_CACHE_SIZE):
+        self.size = size
+        self._texts = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, content_hash: str, file_type: str) -> Optional[str]:
+        key = (content_hash, file_type)
+        with self._lock:
+            text = self._texts.get(key)
+            if text is not None:
+                self._texts.move_to_end(key)
+            return text
+
+    def put(self, content_hash: str, file_type: str, text: str):
+        with self._lock:
+            self._texts[(content_hash, file_type)] = text
+            self._texts.move_to_end((content_hash, file_type))
+            while len(self._texts) > self.size:
+                self._texts.popitem(last=False)
+
+    def discard(self, content_hash: str, file_type: str):
+        with self._lock:
+            self._texts.pop((content_hash, file_type), None)
+
+
 class FileManager:
     """Enhanced file management system for handling dozens of files"""
 
-    def __init__(self, storage_dir: str = "documents", db_path: str = "file_index.db"):
+    def __init__(self, storage_dir: str = "documents", db_path: str = "file_index.db", cache=None):
         self.storage_dir = Path(storage_dir)
         self.storage_dir.mkdir(exist_ok=True)
         self.db_path = db_path
+        self.cache = cache  # Optional Redis client
         self.processor = DocumentProcessor()
         self.chunker = DocumentChunker()
+        self.text_cache = ExtractedTextCache()
         self.init_database()
+        self.pool = ConnectionPool(self.db_path)
+
+    def get_conn(self):
+        """Borrow a pooled database connection (use as a context manager)"""
+        return self.pool.connection()
+
+    def get_files_version(self) -> int:
+        """Current files table version; bumped in the same transaction as every upload"""
+        with self.get_conn() as conn:
+            return conn.execute(_SQL_FILES_VERSION).fetchone()[0]
 
     def init_database(self):
         """Initialize the file index database"""
         conn = sqlite3.connect(self.db_path)
+        # A fresh database has no pages yet, so its page size can still be chosen
+        if conn.execute('PRAGMA page_count').fetchone()[0] == 0:
+            conn.execute(f'PRAGMA page_size={NEW_DATABASE_PAGE_SIZE}')
+        _configure_connection(conn)
         cursor = conn.cursor()
+        schema_before = {row[0] for row in cursor.execute('SELECT name FROM sqlite_master')}
 
         # Files table
         cursor.execute('''
@@ -220,10 +600,21 @@ class FileManager:
                            chunk_count
                            INTEGER
                            DEFAULT
-                           0
+                           0,
+                           mime_type
+                           TEXT
                        )
                        ''')
 
+        # Databases created before mime_type existed get the column and a backfill
+        columns = {row[1] for row in cursor.execute('PRAGMA table_info(files)')}
+        migrated = 'mime_type' not in columns
+        if migrated:
+            cursor.execute('ALTER TABLE files ADD COLUMN mime_type TEXT')
+            rows = cursor.execute('SELECT id, filename FROM files').fetchall()
+            cursor.executemany('UPDATE files SET mime_type = ? WHERE id = ?',
+                               [(mimetypes.guess_type(filename)[0], file_id) for file_id, filename in rows])
+
         # Chunks table for large documents
         cursor.execute('''
                        CREATE TABLE IF NOT EXISTS chunks
@@ -257,10 +648,17 @@ class FileManager:
                            )
                        ''')
 
-        # Full-text search table
+        # Databases before schema version 1 indexed every chunk separately; rebuild with one row per file
+        schema_version = cursor.execute('PRAGMA user_version').fetchone()[0]
+        rebuild_search = schema_version < 1
+        if rebuild_search:
+            migrated = True
+            cursor.execute('DROP TABLE IF EXISTS file_search')
+
+        # Full-text search table, one row per file
         cursor.execute('''
             CREATE VIRTUAL TABLE IF NOT EXISTS file_search USING fts5(
-                file_id,
+                file_id UNINDEXED,
                 filename,
                 content,
                 category,
@@ -268,56 +666,91 @@ class FileManager:
             )
         ''')
 
+        if rebuild_search:
+            cursor.execute('''
+                INSERT INTO file_search (file_id, filename, content, category, tags)
+                SELECT f.id, f.filename, c.content, COALESCE(f.category, ''), f.tags
+                FROM files f
+                JOIN (SELECT file_id, group_concat(content, char(10)) AS content
+                      FROM (SELECT file_id, content FROM chunks ORDER BY file_id, chunk_index)
+                      GROUP BY file_id) c ON c.file_id = f.id
+            ''')
+
+        # Schema version 2 hashes content with BLAKE2b; rows stored before still carry MD5 hashes
+        if schema_version < 2:
+            migrated = True
+            rows = cursor.execute('SELECT id, file_path FROM files').fetchall()
+            rehashed = []
+            for file_id, file_path in rows:
+                try:
+                    rehashed.append((self.calculate_file_hash(file_path), file_id))
+                except OSError:
+                    pass
+            cursor.executemany('UPDATE files SET content_hash = ? WHERE id = ?', rehashed)
+            if len(rehashed) < len(rows):
+                logger.warning(f"{len(rows) - len(rehashed)} stored files are unreadable; they keep their old content hashes")
+            cursor.execute('PRAGMA user_version = 2')
+
+        # Covering index for scans that only need file metadata (stats, listings by id)
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_files_cover
+            ON files(id, file_path, filename, category, file_type, file_size)
+        ''')
+        # Category listings come back already in upload order; file type filters seek instead of scanning
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_files_category ON files(category, upload_date DESC)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_files_type ON files(file_type)')
+
+        # Chunks of a file in order; supersedes the single-column idx_chunks_file_id
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_chunks_file ON chunks(file_id, chunk_index)')
+        cursor.execute('DROP INDEX IF EXISTS idx_chunks_file_id')
+
+        # Duplicate detection looks files up by content; older databases may already hold duplicates
+        try:
+            cursor.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_files_hash ON files(content_hash)')
+        except sqlite3.IntegrityError:
+            logger.warning("Duplicate content hashes in files table; idx_files_hash created without UNIQUE")
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_files_hash ON files(content_hash)')
+
+        # One-row counter of changes to the files table, used for cache keys and ETags
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS files_version (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                version INTEGER NOT NULL
+            )
+        ''')
+        cursor.execute('INSERT OR IGNORE INTO files_version (id, version) VALUES (1, 0)')
+
         conn.commit()
+        # Planner statistics only go stale when the schema or migrated data changed;
+        # bulk uploads refresh them after loading
+        schema_after = {row[0] for row in cursor.execute('SELECT name FROM sqlite_master')}
+        if migrated or schema_after != schema_before:
+            cursor.execute('ANALYZE')
         conn.close()
 
     def generate_file_id(self, filename: str) -> str:
-        """Generate unique file ID"""
-        timestamp = datetime.now().isoformat()
-        return hashlib.md5(f"{filename}_{timestamp}".encode()).hexdigest()
+        """Generate unique file ID (random, so ids can't collide within a fast bulk upload)"""
+        return secrets.token_hex(16)
 
     def calculate_file_hash(self, file_path: str) -> str:
         """Calculate file hash for duplicate detection"""
-        hash_md5 = hashlib.md5()
         with open(file_path, "rb") as f:
-            for chunk in iter(lambda: f.read(4096), b""):
-                hash_md5.update(chunk)
-        return hash_md5.hexdigest()
+            return hashlib.file_digest(f, new_content_hasher).hexdigest()
 
     def detect_file_type(self, file_path: str) -> str:
-        """Detect file type based on extension and content"""
-        mime_type, _ = mimetypes.guess_type(file_path)
-        extension = Path(file_path).suffix.lower()
-
-        type_mapping = {
-            '.pdf': 'pdf',
-            '.docx': 'docx',
-            '.doc': 'doc',
-            '.xlsx': 'excel',
-            '.xls': 'excel',
-            '.txt': 'text',
-            '.md': 'markdown',
-            '.html': 'html',
-            '.htm': 'html',
-            '.json': 'json',
-            '.xml': 'xml'
-        }
+        """Detect file type based on extension"""
+        return _EXT_TYPE.get(os.path.splitext(file_path)[1].lower(), 'unknown')
 
-        return type_mapping.get(extension, 'unknown')
+    def extract_text_content(self, file_path: str, file_type: str, content_hash: str = None) -> str:
+        """Extract text content based on file type, reusing the cached text for known content"""
+        if content_hash is None:
+            return self.processor.extract(file_path, file_type)
 
-    def extract_text_content(self, file_path: str, file_type: str) -> str:
-        """Extract text content based on file type"""
-        extractors = {
-            'pdf': self.processor.extract_text_from_pdf,
-            'docx': self.processor.extract_text_from_docx,
-            'excel': self.processor.extract_text_from_excel,
-            'text': self.processor.extract_text_from_txt,
-            'html': self.processor.extract_text_from_html,
-            'markdown': self.processor.extract_text_from_md
-        }
-
-        extractor = extractors.get(file_type, self.processor.extract_text_from_txt)
-        return extractor(file_path)
+        text = self.text_cache.get(content_hash, file_type)
+        if text is None:
+            text = self.processor.extract(file_path, file_type)
+            self.text_cache.put(content_hash, file_type, text)
+        return text
 
     def upload_file(self, file_path: str, category: str = None, tags: List[str] = None,
                     description: str = None) -> Dict:
@@ -327,123 +760,194 @@ class FileManager:
             if not file_path.exists():
                 raise FileNotFoundError(f"File not found: {file_path}")
 
-            # Generate file info
-            file_id = self.generate_file_id(file_path.name)
-            file_type = self.detect_file_type(str(file_path))
-            file_size = file_path.stat().st_size
+            # Identical content is already indexed: skip the copy, extraction and indexing
             content_hash = self.calculate_file_hash(str(file_path))
+            duplicate = self.find_duplicate(content_hash)
+            if duplicate:
+                return duplicate
 
-            # Copy file to storage
-            storage_path = self.storage_dir / f"{file_id}_{file_path.name}"
-            storage_path.write_bytes(file_path.read_bytes())
+            prepared = self._prepare_local_file(file_path, content_hash, category, tags, description)
+            self._index_prepared_files([prepared])
+        except Exception as e:
+            logger.error(f"Error uploading file {file_path}: {e}")
+            return {'success': False, 'error': str(e)}
 
-            # Extract text content
-            text_content = self.extract_text_content(str(storage_path), file_type)
+        logger.info(f"Successfully uploaded and processed: {prepared['result']['filename']}")
+        return prepared['result']
 
-            # Chunk large documents
-            chunks = self.chunker.chunk_text(text_content, file_id)
+    def upload_stream(self, stream, filename: str, category: str = None, tags: List[str] = None,
+                      description: str = None) -> Dict:
+        """Upload and process a file from a binary stream, hashing it while it is written to storage"""
+        try:
+            stored = self.store_stream(stream, filename)
+        except Exception as e:
+            logger.error(f"Error uploading stream {filename}: {e}")
+            return {'success': False, 'error': str(e)}
 
-            # Store in database
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
+        return self.index_stored_file(stored, category, tags, description)
 
-            # Insert file record
-            cursor.execute('''
-                           INSERT INTO files (id, filename, original_name, file_path, file_type,
-                                              file_size, content_hash, category, tags, description,
-                                              processed, chunk_count)
-                           VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                           ''', (
-                               file_id, file_path.name, str(file_path), str(storage_path),
-                               file_type, file_size, content_hash, category,
-                               json.dumps(tags or []), description, True, len(chunks)
-                           ))
-
-            # Insert chunks
-            for chunk in chunks:
-                cursor.execute('''
-                               INSERT INTO chunks (id, file_id, chunk_index, content, content_preview)
-                               VALUES (?, ?, ?, ?, ?)
-                               ''', (
-                                   chunk['chunk_id'], file_id, chunk['chunk_index'],
-                                   chunk['content'], chunk['content'][:200] + "..."
-                               ))
-
-                # Add to search index - only for non-problematic content
-                try:
-                    cursor.execute('''
-                                   INSERT INTO file_search (file_id, filename, content, category, tags)
-                                   VALUES (?, ?, ?, ?, ?)
-                                   ''', (
-                                       file_id, file_path.name, chunk['content'],
-                                       category or '', json.dumps(tags or [])
-                                   ))
-                except Exception as search_error:
-                    logger.warning(f"FTS5 index error for chunk {chunk['chunk_id']}: {search_error}")
-                    # Continue without FTS5 indexing for this chunk
+    def store_stream(self, stream, filename: str) -> Dict:
+        """Write a binary stream into storage, hashing it on the way; returns what indexing needs"""
+        file_id = self.generate_file_id(filename)
+        storage_path = self.storage_dir / f"{file_id}_{filename}"
 
-            conn.commit()
-            conn.close()
+        # Single pass over the bytes: hash and write to storage together
+        file_hash = new_content_hasher()
+        file_size = 0
+        try:
+            with open(storage_path, 'wb') as target:
+                for block in iter(lambda: stream.read(UPLOAD_BLOCK_SIZE), b""):
+                    file_hash.update(block)
+                    target.write(block)
+                    file_size += len(block)
+        except Exception:
+            storage_path.unlink(missing_ok=True)
+            raise
 
-            logger.info(f"Successfully uploaded and processed: {file_path.name}")
-            return {
+        return {
+            'file_id': file_id,
+            'filename': filename,
+            'storage_path': str(storage_path),
+            'file_type': self.detect_file_type(filename),
+            'file_size': file_size,
+            'content_hash': file_hash.hexdigest()
+        }
+
+    def index_stored_file(self, stored: Dict, category: str = None, tags: List[str] = None,
+                          description: str = None) -> Dict:
+        """Extract, chunk and index a file written by store_stream"""
+        storage_path = Path(stored['storage_path'])
+        try:
+            duplicate = self.find_duplicate(stored['content_hash'])
+            if duplicate:
+                storage_path.unlink(missing_ok=True)
+                return duplicate
+
+            prepared = self._prepare_stored_file(
+                stored['file_id'], stored['filename'], stored['filename'], storage_path,
+                stored['file_type'], stored['file_size'], stored['content_hash'],
+                category, tags, description
+            )
+            self._index_prepared_files([prepared])
+        except Exception as e:
+            logger.error(f"Error uploading stream {stored['filename']}: {e}")
+            # Don't leave half-processed files behind in storage
+            storage_path.unlink(missing_ok=True)
+            return {'success': False, 'error': str(e)}
+
+        logger.info(f"Successfully uploaded and processed: {stored['filename']}")
+        return prepared['result']
+
+    def find_duplicate(self, content_hash: str) -> Optional[Dict]:
+        """Upload result for an already indexed file with the same content, if there is one"""
+        with self.get_conn() as conn:
+            row = conn.execute(_SQL_FIND_BY_HASH, (content_hash,)).fetchone()
+
+        if row is None:
+            return None
+        return {
+            'file_id': row[0],
+            'filename': row[1],
+            'file_type': row[2],
+            'chunks': row[3],
+            'success': True,
+            'duplicate': True
+        }
+
+    def _prepare_local_file(self, file_path: Path, content_hash: str, category: str = None,
+                            tags: List[str] = None, description: str = None, text_content: str = None) -> Dict:
+        """Copy a local file into storage and prepare its index rows"""
+        # Generate file info
+        file_id = self.generate_file_id(file_path.name)
+        file_type = self.detect_file_type(str(file_path))
+        file_size = file_path.stat().st_size
+
+        # Copy file to storage (kernel-side copy, the bytes never pass through Python)
+        storage_path = self.storage_dir / f"{file_id}_{safe_filename(file_path.name)}"
+        shutil.copyfile(file_path, storage_path)
+
+        try:
+            return self._prepare_stored_file(
+                file_id, file_path.name, str(file_path), storage_path, file_type,
+                file_size, content_hash, category, tags, description, text_content
+            )
+        except Exception:
+            storage_path.unlink()
+            raise
+
+    def _prepare_stored_file(self, file_id: str, filename: str, original_name: str, storage_path: Path,
+                             file_type: str, file_size: int, content_hash: str, category: str = None,
+                             tags: List[str] = None, description: str = None, text_content: str = None) -> Dict:
+        """Extract (unless text_content is given) and chunk a stored file into the rows that index it"""
+        # Extract text content
+        if text_content is None:
+            text_content = self.extract_text_content(str(storage_path), file_type, content_hash)
+
+        # Lone surrogates can't be stored as SQLite text; replace them so the inserts can't fail on content
+        try:
+            text_content.encode('utf-8')
+        except UnicodeEncodeError:
+            text_content = text_content.encode('utf-8', 'replace').decode('utf-8')
+
+        # Chunk large documents
+        chunks = self.chunker.chunk_text(text_content, file_id)
+
+        tags_json = json.dumps(tags or [])
+        return {
+            'storage_path': storage_path,
+            'file_row': (
+                file_id, filename, original_name, str(storage_path),
+                file_type, file_size, content_hash, category,
+                tags_json, description, True, len(chunks),
+                mimetypes.guess_type(filename)[0]
+            ),
+            'chunk_rows': [
+                (chunk['chunk_id'], file_id, chunk['chunk_index'],
+                 chunk['content'], preview_text(chunk['content']))
+                for chunk in chunks
+            ],
+            'search_row': (file_id, filename, text_content, category or '', tags_json),
+            'result': {
                 'file_id': file_id,
-                'filename': file_path.name,
+                'filename': filename,
                 'file_type': file_type,
                 'chunks': len(chunks),
                 'success': True
             }
+        }
 
-        except Exception as e:
-            logger.error(f"Error uploading file {file_path}: {e}")
-            return {'success': False, 'error': str(e)}
+    def _index_prepared_files(self, prepared_files: List[Dict]):
+        """Insert prepared files, chunks and search rows in a single transaction"""
+        with self.get_conn() as conn:
+            cursor = conn.cursor()
+            # Take the write lock up front instead of upgrading a deferred transaction mid-way
+            cursor.execute('BEGIN IMMEDIATE')
+            cursor.executemany(_SQL_INSERT_FILE, [prepared['file_row'] for prepared in prepared_files])
+            cursor.executemany(_SQL_INSERT_CHUNK,
+                               [row for prepared in prepared_files for row in prepared['chunk_rows']])
+
+            # Add to search index
+            cursor.executemany(_SQL_INSERT_SEARCH_ROW, [prepared['search_row'] for prepared in prepared_files])
+
+            cursor.execute(_SQL_BUMP_FILES_VERSION)
+
+        # Indexed content is answered by the duplicate check from now on; only failed inserts are retried
+        for prepared in prepared_files:
+            file_row = prepared['file_row']
+            self.text_cache.discard(file_row[6], file_row[4])
 
     def clean_search_query(self, query: str) -> str:
         """Clean search query to avoid FTS5 syntax errors"""
-        import re
-
-        # Remove special characters that cause FTS5 issues
-        query = query.replace('"', '')
-        query = query.replace("'", '')
-        query = query.replace('?', '')
-        query = query.replace('(', '')
-        query = query.replace(')', '')
-        query = query.replace('[', '')
-        query = query.replace(']', '')
-        query = query.replace('{', '')
-        query = query.replace('}', '')
-        query = query.replace('*', '')
-        query = query.replace('+', '')
-        query = query.replace('-', ' ')
-
-        # Split into words and rejoin
-        words = query.split()
-        cleaned_words = []
-
-        for word in words:
-            if len(word) >= 2:  # Only include words with 2+ characters
-                cleaned_words.append(word)
-
-        return ' '.join(cleaned_words) if cleaned_words else query
+        # Remove special characters that cause FTS5 issues (one pass over the query)
+        query = query.translate(_FTS_QUERY_TRANSLATION)
+
+        # Split into words and rejoin, keeping only words with 2+ characters
+        return ' '.join([word for word in query.split() if len(word) >= 2]) or query
 
     def fallback_search(self, query: str, category: str = None, file_type: str = None) -> List[Dict]:
         """Fallback search using simple LIKE queries"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-
         try:
-            search_query = """
-                           SELECT DISTINCT f.id, \
-                                           f.filename, \
-                                           f.file_type, \
-                                           f.category, \
-                                           f.description,
-                                           f.chunk_count, \
-                                           SUBSTR(c.content, 1, 300) as snippet
-                           FROM files f
-                                    JOIN chunks c ON f.id = c.file_id
-                           WHERE (c.content LIKE ? OR f.filename LIKE ? OR f.description LIKE ?) \
-                           """
+            search_query = _SQL_SEARCH_LIKE
             params = [f"%{query}%", f"%{query}%", f"%{query}%"]
 
             if category:
@@ -456,8 +960,8 @@ class FileManager:
 
             search_query += " ORDER BY f.upload_date DESC LIMIT 20"
 
-            cursor.execute(search_query, params)
-            results = cursor.fetchall()
+            with self.get_conn() as conn:
+                results = conn.execute(search_query, params).fetchall()
 
             search_results = []
             for row in results:
@@ -471,19 +975,14 @@ class FileManager:
                     'snippet': row[6] if row[6] else ""
                 })
 
-            conn.close()
             return search_results
 
         except Exception as e:
             logger.error(f"Fallback search error: {e}")
-            conn.close()
             return []
 
     def search_files(self, query: str, category: str = None, file_type: str = None) -> List[Dict]:
         """Search through all files and their content - FIXED VERSION"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-
         try:
             # Clean the query to avoid FTS5 syntax errors
             cleaned_query = self.clean_search_query(query)
@@ -492,8 +991,8 @@ class FileManager:
                 return self.fallback_search(query, category, file_type)
 
             # Check if query contains Azerbaijani characters or problematic symbols
-            has_azerbaijani = any(char in query for char in ['ə', 'ı', 'ö', 'ü', 'ğ', 'ş', 'ç'])
-            has_special_chars = any(char in query for char in ['"', "'", '?', '(', ')', '[', ']'])
+            has_azerbaijani = not _AZERBAIJANI_CHARS.isdisjoint(query)
+            has_special_chars = not _QUERY_SPECIAL_CHARS.isdisjoint(query)
 
             if has_azerbaijani or has_special_chars:
                 # Use LIKE search for Azerbaijani or special characters
@@ -501,18 +1000,7 @@ class FileManager:
 
             # Try FTS5 search for simple queries
             try:
-                search_query = """
-                               SELECT DISTINCT f.id, \
-                                               f.filename, \
-                                               f.file_type, \
-                                               f.category, \
-                                               f.description,
-                                               f.chunk_count, \
-                                               snippet(file_search, 2, '<mark>', '</mark>', '...', 32) as snippet
-                               FROM files f
-                                        JOIN file_search fs ON f.id = fs.file_id
-                               WHERE file_search MATCH ? \
-                               """
+                search_query = _SQL_SEARCH_FTS
                 params = [cleaned_query]
 
                 # Add category filter if specified
@@ -525,10 +1013,12 @@ class FileManager:
                     search_query += " AND f.file_type = ?"
                     params.append(file_type)
 
-                search_query += " ORDER BY f.upload_date DESC LIMIT 20"
+                # Best matches first (bm25 is lower for better matches)
+                search_query += f" ORDER BY bm25(file_search, {FTS_COLUMN_WEIGHTS}) LIMIT 20"
 
-                cursor.execute(search_query, params)
-                results = cursor.fetchall()
+                # The connection goes back to the pool before any fallback search borrows one
+                with self.get_conn() as conn:
+                    results = conn.execute(search_query, params).fetchall()
 
                 search_results = []
                 for row in results:
@@ -542,52 +1032,33 @@ class FileManager:
                         'snippet': row[6] if row[6] else ""
                     })
 
-                conn.close()
                 return search_results
 
             except Exception as fts_error:
                 logger.warning(f"FTS5 search failed: {fts_error}, falling back to LIKE search")
-                conn.close()
                 return self.fallback_search(query, category, file_type)
 
         except Exception as e:
             logger.error(f"Search error: {e}")
-            conn.close()
             return self.fallback_search(query, category, file_type)
 
     def get_file_content(self, file_id: str, chunk_index: int = None) -> Dict:
         """Get file content, optionally specific chunk"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        with self.get_conn() as conn:
+            cursor = conn.cursor()
 
-        if chunk_index is not None:
-            cursor.execute('''
-                           SELECT content
-                           FROM chunks
-                           WHERE file_id = ?
-                             AND chunk_index = ?
-                           ''', (file_id, chunk_index))
-            result = cursor.fetchone()
-            content = result[0] if result else ""
-        else:
-            cursor.execute('''
-                           SELECT content
-                           FROM chunks
-                           WHERE file_id = ?
-                           ORDER BY chunk_index
-                           ''', (file_id,))
-            chunks = cursor.fetchall()
-            content = "\n\n".join([chunk[0] for chunk in chunks])
-
-        # Get file info
-        cursor.execute('''
-                       SELECT filename, file_type, category, description, chunk_count
-                       FROM files
-                       WHERE id = ?
-                       ''', (file_id,))
-        file_info = cursor.fetchone()
+            if chunk_index is not None:
+                cursor.execute(_SQL_CHUNK_CONTENT, (file_id, chunk_index))
+                result = cursor.fetchone()
+                content = result[0] if result else ""
+            else:
+                cursor.execute(_SQL_FILE_CONTENT, (file_id,))
+                chunks = cursor.fetchall()
+                content = "\n\n".join([chunk[0] for chunk in chunks])
 
-        conn.close()
+            # Get file info
+            cursor.execute(_SQL_FILE_INFO, (file_id,))
+            file_info = cursor.fetchone()
 
         if file_info:
             return {
@@ -600,41 +1071,43 @@ class FileManager:
             }
         return {'error': 'File not found'}
 
+    def get_file_contents_batch(self, file_ids: List[str]) -> Dict[str, Dict]:
+        """Full content and info for several files, keyed by file id; missing ids are left out"""
+        files = {}
+        with self.get_conn() as conn:
+            for start in range(0, len(file_ids), SQL_IN_BATCH_SIZE):
+                batch = file_ids[start:start + SQL_IN_BATCH_SIZE]
+                placeholders = ','.join('?' * len(batch))
+
+                chunks = {}
+                for file_id, content in conn.execute(_SQL_FILES_CONTENT_IN.format(placeholders), batch):
+                    chunks.setdefault(file_id, []).append(content)
+
+                for row in conn.execute(_SQL_FILES_INFO_IN.format(placeholders), batch):
+                    files[row[0]] = {
+                        'content': "\n\n".join(chunks.get(row[0], [])),
+                        'filename': row[1],
+                        'file_type': row[2],
+                        'category': row[3],
+                        'description': row[4],
+                        'chunk_count': row[5]
+                    }
+        return files
+
+    @cached_file_list
     def list_files(self, category: str = None) -> List[Dict]:
         """List all uploaded files"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        with self.get_conn() as conn:
+            cursor = conn.cursor()
 
-        if category:
-            cursor.execute('''
-                           SELECT id,
-                                  filename,
-                                  file_type,
-                                  file_size,
-                                  category,
-                                  description,
-                                  upload_date,
-                                  chunk_count
-                           FROM files
-                           WHERE category = ?
-                           ORDER BY upload_date DESC
-                           ''', (category,))
-        else:
-            cursor.execute('''
-                           SELECT id,
-                                  filename,
-                                  file_type,
-                                  file_size,
-                                  category,
-                                  description,
-                                  upload_date,
-                                  chunk_count
-                           FROM files
-                           ORDER BY upload_date DESC
-                           ''')
+            if category:
+                cursor.execute(_SQL_LIST_FILES_IN_CATEGORY, (category,))
+            else:
+                cursor.execute(_SQL_LIST_FILES)
+            rows = cursor.fetchall()
 
         files = []
-        for row in cursor.fetchall():
+        for row in rows:
             files.append({
                 'file_id': row[0],
                 'filename': row[1],
@@ -646,9 +1119,64 @@ class FileManager:
                 'chunk_count': row[7]
             })
 
-        conn.close()
         return files
 
+    def find_by_filename(self, pattern: str, limit: int = 1) -> List[Dict]:
+        """Newest files whose name contains the pattern, ignoring case"""
+        # LIKE wildcards in the pattern are matched literally
+        escaped = pattern.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        with self.get_conn() as conn:
+            rows = conn.execute(_SQL_FIND_BY_FILENAME, (f'%{escaped}%', limit)).fetchall()
+
+        return [{
+            'file_id': row[0],
+            'filename': row[1],
+            'file_type': row[2],
+            'category': row[3],
+            'upload_date': row[4]
+        } for row in rows]
+
+    def get_file_paths(self, file_ids: List[str]) -> Dict[str, str]:
+        """Map file ids to storage paths, looking them up in batches of SQL_IN_BATCH_SIZE"""
+        paths = {}
+        with self.get_conn() as conn:
+            for start in range(0, len(file_ids), SQL_IN_BATCH_SIZE):
+                batch = file_ids[start:start + SQL_IN_BATCH_SIZE]
+                placeholders = ','.join('?' * len(batch))
+                paths.update(conn.execute(_SQL_FILE_PATHS_IN.format(placeholders), batch).fetchall())
+        return paths
+
+    def list_files_with_paths(self) -> List[Dict]:
+        """List all uploaded files together with their storage paths in a single query"""
+        with self.get_conn() as conn:
+            rows = conn.execute(_SQL_LIST_FILES_WITH_PATHS).fetchall()
+
+        return [{
+            'file_id': row[0],
+            'filename': row[1],
+            'file_type': row[2],
+            'file_size': row[3],
+            'category': row[4],
+            'description': row[5],
+            'upload_date': row[6],
+            'chunk_count': row[7],
+            'file_path': row[8]
+        } for row in rows]
+
+    def get_stats(self) -> Dict:
+        """Aggregate file counts and sizes in SQL"""
+        with self.get_conn() as conn:
+            total_files, total_size = conn.execute(_SQL_STATS_TOTALS).fetchone()
+            file_types = conn.execute(_SQL_STATS_BY_TYPE).fetchall()
+            categories = conn.execute(_SQL_STATS_BY_CATEGORY).fetchall()
+
+        return {
+            'total_files': total_files,
+            'file_types': {row[0]: row[1] for row in file_types},
+            'categories': {row[0]: row[1] for row in categories},
+            'total_size': total_size
+        }
+
     def bulk_upload(self, directory_path: str, category: str = None) -> Dict:
         """Upload all files from a directory"""
         directory = Path(directory_path)
@@ -658,13 +1186,82 @@ class FileManager:
         results = {'successful': [], 'failed': []}
         supported_extensions = {'.pdf', '.docx', '.xlsx', '.txt', '.md', '.html'}
 
+        # Hash every file first; only content not seen before goes on to extraction
+        new_files = []  # (file path, content hash)
+        batch_hashes = set()
+        batch_duplicates = []  # (file path, content hash) for repeats of a file in this batch
         for file_path in directory.rglob('*'):
             if file_path.is_file() and file_path.suffix.lower() in supported_extensions:
-                result = self.upload_file(str(file_path), category=category)
-                if result.get('success'):
-                    results['successful'].append(result)
-                else:
-                    results['failed'].append({'file': str(file_path), 'error': result.get('error')})
+                try:
+                    content_hash = self.calculate_file_hash(str(file_path))
+                    if content_hash in batch_hashes:
+                        batch_duplicates.append((file_path, content_hash))
+                        continue
+
+                    duplicate = self.find_duplicate(content_hash)
+                    if duplicate:
+                        results['successful'].append(duplicate)
+                        continue
+
+                    batch_hashes.add(content_hash)
+                    new_files.append((file_path, content_hash))
+                except Exception as e:
+                    logger.error(f"Error uploading file {file_path}: {e}")
+                    results['failed'].append({'file': str(file_path), 'error': str(e)})
+
+        # Extraction is CPU-bound Python, so it runs in worker processes; copying,
+        # chunking and the database writes stay in this process
+        prepared_by_hash = {}
+        if new_files:
+            with ProcessPoolExecutor(max_workers=min(len(new_files), os.cpu_count() or 1)) as executor:
+                extractions = []
+                for file_path, content_hash in new_files:
+                    file_type = self.detect_file_type(str(file_path))
+                    text = self.text_cache.get(content_hash, file_type)
+                    if text is None:
+                        text = executor.submit(_extract_worker, str(file_path), file_type)
+                    extractions.append((file_path, content_hash, file_type, text))
+                for file_path, content_hash, file_type, extraction in extractions:
+                    try:
+                        if isinstance(extraction, str):
+                            text_content = extraction
+                        else:
+                            text_content = extraction.result()
+                            self.text_cache.put(content_hash, file_type, text_content)
+                        prepared_by_hash[content_hash] = self._prepare_local_file(
+                            file_path, content_hash, category=category, text_content=text_content
+                        )
+                    except Exception as e:
+                        logger.error(f"Error uploading file {file_path}: {e}")
+                        results['failed'].append({'file': str(file_path), 'error': str(e)})
+
+        # Repeats inside the batch share the result of the copy that was prepared
+        for file_path, content_hash in batch_duplicates:
+            if content_hash not in prepared_by_hash:
+                results['failed'].append({'file': str(file_path), 'error': 'Duplicate of a file that failed'})
+
+        prepared_files = list(prepared_by_hash.values())
+        if prepared_files:
+            try:
+                self._index_prepared_files(prepared_files)
+                results['successful'].extend(prepared['result'] for prepared in prepared_files)
+                results['successful'].extend(
+                    {**prepared_by_hash[content_hash]['result'], 'duplicate': True}
+                    for _, content_hash in batch_duplicates if content_hash in prepared_by_hash
+                )
+            except Exception as e:
+                logger.error(f"Error indexing bulk upload from {directory}: {e}")
+                for prepared in prepared_files:
+                    prepared['storage_path'].unlink(missing_ok=True)
+                    results['failed'].append({'file': prepared['file_row'][2], 'error': str(e)})
+                for file_path, content_hash in batch_duplicates:
+                    if content_hash in prepared_by_hash:
+                        results['failed'].append({'file': str(file_path), 'error': str(e)})
+
+            # Refresh planner statistics once after the batch
+            if results['successful']:
+                with self.get_conn() as conn:
+                    conn.execute('ANALYZE files')
 
         return {
             'total_processed': len(results['successful']) + len(results['failed']),
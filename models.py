@@ -1,70 +1,130 @@
 import google.generativeai as genai
 import json
+import re
 import sqlite3
 import hashlib
-from datetime import datetime
+import hmac
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from functools import lru_cache
 from file_manager import FileManager
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Static knowledge search ignores short words and these common ones, which match nearly every entry,
+# and returns at most this many lines so the prompt stays bounded
+STATIC_SEARCH_STOPWORDS = frozenset({'və', 'ilə', 'üçün', 'bir', 'bu', 'o', 'nə', 'ki'})
+STATIC_SEARCH_MIN_TERM_LENGTH = 3
+STATIC_SEARCH_MAX_RESULTS = 20
+
+# Query fragments that scope a static search to one category of static_data
+STATIC_CATEGORY_HINTS = {
+    'layihə': 'projects',
+    'proje': 'projects',
+    'əlaqə': 'contacts',
+    'telefon': 'contacts',
+    'email': 'contacts',
+    'ərizə': 'templates',
+    'şablon': 'templates',
+    'məzuniyyə': 'regulations',
+    'iş saat': 'regulations',
+    'şöbə': 'structure'
+}
+
+# Document search results are reused for this long; uploads invalidate them sooner through the files version
+SEARCH_CACHE_TTL = 300
+SEARCH_CACHE_SIZE = 512
+
+
+class SearchResultCache:
+    """Thread-safe LRU of search results that expire after a TTL"""
+
+    def __init__(self, size: int = SEARCH_CACHE_SIZE, ttl: float = SEARCH_CACHE_TTL):
+        self.size = size
+        self.ttl = ttl
+        self._results = OrderedDict()  # key -> (expiry time, result)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._results.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._results[key]
+                return None
+            self._results.move_to_end(key)
+            return entry[1]
+
+    def put(self, key, result):
+        with self._lock:
+            self._results[key] = (time.monotonic() + self.ttl, result)
+            self._results.move_to_end(key)
+            while len(self._results) > self.size:
+                self._results.popitem(last=False)
+
 
 class EnhancedKnowledgeBase:
     """Enhanced knowledge base that integrates with file management system"""
 
-    def __init__(self, file_manager: FileManager):
-        self.file_manager = file_manager
-        self.static_data = {
-            "structure": {
-                "nazirlik": "Nazirlik aşağıdakı əsas şöbələrdən ibarətdir: İdarəetmə Şöbəsi, Maliyyə Şöbəsi, İnsan Resursları, Texniki Dəstək və Layihə İdarəetməsi.",
-                "şöbələr": "Bizim nazirlikdə 5 əsas şöbə var: İdarəetmə (20 nəfər), Maliyyə (15 nəfər), İnsan Resursları (8 nəfər), Texniki Dəstək (12 nəfər), Layihə İdarəetməsi (25 nəfər).",
-                "struktur": "İdarəetmə Şöbəsi - Kamran Məmmədov, Maliyyə Şöbəsi - Səməd Əliyev, İnsan Resursları - Günel Məmmədova, Texniki Dəstək - Elvin Qasımov, Layihə İdarəetməsi - Rəşad Həsənov"
-            },
-            "contacts": {
-                "maliyyə": "Maliyyə şöbəsi üçün əlaqə: Rəhbər - Səməd Əliyev (samad.aliyev@nazirlik.gov.az, +994-12-555-0101)",
-                "hr": "İnsan Resursları üçün əlaqə: Rəhbər - Günel Məmmədova (gunel.mammadova@nazirlik.gov.az, +994-12-555-0102)",
-                "texniki": "Texniki Dəstək üçün əlaqə: Rəhbər - Elvin Qasımov (elvin.qasimov@nazirlik.gov.az, +994-12-555-0103)",
-                "idarəetmə": "İdarəetmə Şöbəsi üçün əlaqə: Rəhbər - Kamran Məmmədov (kamran.mammadov@nazirlik.gov.az, +994-12-555-0100)",
-                "layihə": "Layihə İdarəetməsi üçün əlaqə: Rəhbər - Rəşad Həsənov (rashad.hasanov@nazirlik.gov.az, +994-12-555-0104)"
+    # Fixed onboarding knowledge, shared by every instance
+    static_data = {
+        "structure": {
+            "nazirlik": "Nazirlik aşağıdakı əsas şöbələrdən ibarətdir: İdarəetmə Şöbəsi, Maliyyə Şöbəsi, İnsan Resursları, Texniki Dəstək və Layihə İdarəetməsi.",
+            "şöbələr": "Bizim nazirlikdə 5 əsas şöbə var: İdarəetmə (20 nəfər), Maliyyə (15 nəfər), İnsan Resursları (8 nəfər), Texniki Dəstək (12 nəfər), Layihə İdarəetməsi (25 nəfər).",
+            "struktur": "İdarəetmə Şöbəsi - Kamran Məmmədov, Maliyyə Şöbəsi - Səməd Əliyev, İnsan Resursları - Günel Məmmədova, Texniki Dəstək - Elvin Qasımov, Layihə İdarəetməsi - Rəşad Həsənov"
+        },
+        "contacts": {
+            "maliyyə": "Maliyyə şöbəsi üçün əlaqə: Rəhbər - Səməd Əliyev (samad.aliyev@nazirlik.gov.az, +994-12-555-0101)",
+            "hr": "İnsan Resursları üçün əlaqə: Rəhbər - Günel Məmmədova (gunel.mammadova@nazirlik.gov.az, +994-12-555-0102)",
+            "texniki": "Texniki Dəstək üçün əlaqə: Rəhbər - Elvin Qasımov (elvin.qasimov@nazirlik.gov.az, +994-12-555-0103)",
+            "idarəetmə": "İdarəetmə Şöbəsi üçün əlaqə: Rəhbər - Kamran Məmmədov (kamran.mammadov@nazirlik.gov.az, +994-12-555-0100)",
+            "layihə": "Layihə İdarəetməsi üçün əlaqə: Rəhbər - Rəşad Həsənov (rashad.hasanov@nazirlik.gov.az, +994-12-555-0104)"
+        },
+        "documents": {
+            "məzuniyyət": "Məzuniyyət ərizəsi nümunəsi: TARİX, AD SOYAD, VƏZİFƏ, məzuniyyət növü və müddəti qeyd edilməlidir. HR şöbəsi ilə əlaqə: gunel.mammadova@nazirlik.gov.az",
+            "ezamiyyə": "Ezamiyyə ərizəsi nümunəsi: Ezamiyyə yeri, müddəti, məqsədi və xərc hesablaması daxil edilməlidir. Günlük yemək pulu 25 AZN, yaşayış 50 AZN.",
+            "arayış": "Arayış şablonu: Standart arayış formatı ilə hazırlanmalıdır. HR şöbəsi tərəfindən verilir.",
+            "ərizə": "Bütün ərizə növləri üçün HR şöbəsi ilə əlaqə saxlayın: +994-12-555-0102"
+        },
+        "regulations": {
+            "məzuniyyət_günləri": "İllik məzuniyyət hüququ: 21 iş günü əsas məzuniyyət + əlavə məzuniyyətlər (10+ il staj üçün əlavə 3 gün).",
+            "maliyyə_hesablama": "Ezamiyyə xərcləri: günlük yemək pulu 25 AZN, yaşayış 50 AZN, nəqliyyat faktiki xərc üzrə hesablanır.",
+            "işə_qəbul": "Yeni işçi qəbulu proseduru: CV təqdimi → müayinə → sənəd təhvili → təlim proqramı → trial period 3 ay.",
+            "iş_saatları": "İş saatları: 09:00-18:00, nahar fasiləsi: 13:00-14:00",
+            "xəstəlik": "Xəstəlik məzuniyyəti üçün həkim arayışı tələb olunur. 3 gündən çox olan hallarda rəsmi arayış məcburidir."
+        },
+        "projects": {
+            "rəqəmsal_həkimlik": {
+                "status": "Development fazasında (75% hazır)",
+                "contact": "Layihə rəhbəri: Dr. Zaur Əhmədov (zaur.ahmadov@nazirlik.gov.az, +994-12-555-0201)",
+                "lastUpdate": "2024-12-15",
+                "document": "Rəqəmsal_Həkimlik_Layihəsi_v2.3.pdf",
+                "deadline": "2025-ci il mart ayı"
             },
-            "documents": {
-                "məzuniyyət": "Məzuniyyət ərizəsi nümunəsi: TARİX, AD SOYAD, VƏZİFƏ, məzuniyyət növü və müddəti qeyd edilməlidir. HR şöbəsi ilə əlaqə: gunel.mammadova@nazirlik.gov.az",
-                "ezamiyyə": "Ezamiyyə ərizəsi nümunəsi: Ezamiyyə yeri, müddəti, məqsədi və xərc hesablaması daxil edilməlidir. Günlük yemək pulu 25 AZN, yaşayış 50 AZN.",
-                "arayış": "Arayış şablonu: Standart arayış formatı ilə hazırlanmalıdır. HR şöbəsi tərəfindən verilir.",
-                "ərizə": "Bütün ərizə növləri üçün HR şöbəsi ilə əlaqə saxlayın: +994-12-555-0102"
+            "smart_city": {
+                "status": "Pilot test fazasında (60% hazır)",
+                "contact": "Layihə rəhbəri: Nigar Həsənova (nigar.hasanova@nazirlik.gov.az, +994-12-555-0202)",
+                "lastUpdate": "2024-12-20",
+                "document": "Smart_City_Implementation_v1.8.pdf",
+                "test_area": "Yasamal rayonu"
             },
-            "regulations": {
-                "məzuniyyət_günləri": "İllik məzuniyyət hüququ: 21 iş günü əsas məzuniyyət + əlavə məzuniyyətlər (10+ il staj üçün əlavə 3 gün).",
-                "maliyyə_hesablama": "Ezamiyyə xərcləri: günlük yemək pulu 25 AZN, yaşayış 50 AZN, nəqliyyat faktiki xərc üzrə hesablanır.",
-                "işə_qəbul": "Yeni işçi qəbulu proseduru: CV təqdimi → müayinə → sənəd təhvili → təlim proqramı → trial period 3 ay.",
-                "iş_saatları": "İş saatları: 09:00-18:00, nahar fasiləsi: 13:00-14:00",
-                "xəstəlik": "Xəstəlik məzuniyyəti üçün həkim arayışı tələb olunur. 3 gündən çox olan hallarda rəsmi arayış məcburidir."
-            },
-            "projects": {
-                "rəqəmsal_həkimlik": {
-                    "status": "Development fazasında (75% hazır)",
-                    "contact": "Layihə rəhbəri: Dr. Zaur Əhmədov (zaur.ahmadov@nazirlik.gov.az, +994-12-555-0201)",
-                    "lastUpdate": "2024-12-15",
-                    "document": "Rəqəmsal_Həkimlik_Layihəsi_v2.3.pdf",
-                    "deadline": "2025-ci il mart ayı"
-                },
-                "smart_city": {
-                    "status": "Pilot test fazasında (60% hazır)",
-                    "contact": "Layihə rəhbəri: Nigar Həsənova (nigar.hasanova@nazirlik.gov.az, +994-12-555-0202)",
-                    "lastUpdate": "2024-12-20",
-                    "document": "Smart_City_Implementation_v1.8.pdf",
-                    "test_area": "Yasamal rayonu"
-                },
-                "e_governance": {
-                    "status": "İnisial fazada (25% hazır)",
-                    "contact": "Layihə rəhbəri: Tural Əliyev (tural.aliyev@nazirlik.gov.az, +994-12-555-0203)",
-                    "lastUpdate": "2024-12-10",
-                    "document": "E_Governance_Proposal_v1.2.pdf",
-                    "start_date": "2025-ci il yanvar"
-                }
-            },
-            "templates": {
-                "məzuniyyət_ərizəsi": """TARİX: [Tarix]
+            "e_governance": {
+                "status": "İnisial fazada (25% hazır)",
+                "contact": "Layihə rəhbəri: Tural Əliyev (tural.aliyev@nazirlik.gov.az, +994-12-555-0203)",
+                "lastUpdate": "2024-12-10",
+                "document": "E_Governance_Proposal_v1.2.pdf",
+                "start_date": "2025-ci il yanvar"
+            }
+        },
+        "templates": {
+            "məzuniyyət_ərizəsi": """TARİX: [Tarix]
 KÖMÜNƏ: [Şöbə rəhbəri]
 KİMDƏN: [Ad Soyad, Vəzifə]
 
@@ -77,7 +137,7 @@ Hörmətli [Rəhbər adı],
 Hörmətlə,
 [Ad Soyad]""",
 
-                "ezamiyyə_ərizəsi": """TARİX: [Tarix]
+            "ezamiyyə_ərizəsi": """TARİX: [Tarix]
 KÖMÜNƏ: [Şöbə rəhbəri]
 KİMDƏN: [Ad Soyad, Vəzifə]
 
@@ -92,49 +152,152 @@ Təxmini xərc: [Məbləğ] AZN
 
 Hörmətlə,
 [Ad Soyad]"""
-            }
         }
+    }
+
+    # Search indexes over static_data, built by the first instance and shared by the rest
+    _static_lines = None  # formatted "key: value" result line per entry, in static_data order
+    _static_word_index = None  # lowercased word -> positions in _static_lines
+    _static_category_positions = None  # category -> positions of its entries
+    _static_fts = None
+    _static_fts_lock = threading.Lock()
+    _static_index_lock = threading.Lock()
+
+    def __init__(self, file_manager: FileManager):
+        self.file_manager = file_manager
+        self._build_static_index()
+        self._document_search_cache = SearchResultCache()
+
+    @classmethod
+    def _build_static_index(cls):
+        """Index the lowercased words of every static entry once, instead of rescanning the text per query"""
+        with cls._static_index_lock:
+            if cls._static_lines is not None:
+                return
+
+            entries = []
+            word_index = {}
+            category_positions = {}
+            for category, items in cls.static_data.items():
+                for key, value in items.items():
+                    position = len(entries)
+                    entries.append((key, value))
+                    category_positions.setdefault(category, set()).add(position)
+                    for word in f"{key.lower()} {str(value).lower()}".split():
+                        word_index.setdefault(word, set()).add(position)
+
+            # Trigram full-text table over the same lowercased text answers substring lookups of 3+ characters;
+            # case_sensitive keeps it matching exactly what str.lower() produced
+            try:
+                fts = sqlite3.connect(':memory:', check_same_thread=False)
+                fts.execute("CREATE VIRTUAL TABLE kb_fts USING fts5(text, tokenize='trigram case_sensitive 1')")
+                fts.executemany('INSERT INTO kb_fts (rowid, text) VALUES (?, ?)', [
+                    (position, f"{key.lower()} {str(value).lower()}")
+                    for position, (key, value) in enumerate(entries)
+                ])
+            except sqlite3.OperationalError as e:
+                # SQLite older than 3.34 has no trigram tokenizer; the word index covers every term
+                logger.warning(f"Static knowledge FTS unavailable: {e}")
+                fts = None
+
+            cls._static_word_index = word_index
+            cls._static_category_positions = {category: frozenset(positions)
+                                              for category, positions in category_positions.items()}
+            cls._static_fts = fts
+            cls._static_lines = [
+                f"{key}: {json.dumps(value, ensure_ascii=False)}" if isinstance(value, dict) else f"{key}: {value}"
+                for key, value in entries
+            ]
+
+    # Query terms repeat a lot, so remember which entries each one matched
+    @classmethod
+    @lru_cache(maxsize=1024)
+    def _match_static_term(cls, term: str) -> frozenset:
+        """Entries whose key or value contains the term"""
+        if cls._static_fts is not None and len(term) >= 3:
+            with cls._static_fts_lock:
+                rows = cls._static_fts.execute(
+                    'SELECT rowid FROM kb_fts WHERE kb_fts MATCH ?', ('"' + term.replace('"', '""') + '"',)
+                ).fetchall()
+            return frozenset(row[0] for row in rows)
+
+        # Too short for trigrams; terms have no whitespace, so any match lies within one indexed word
+        positions = set()
+        for word, word_positions in cls._static_word_index.items():
+            if term in word:
+                positions |= word_positions
+        return frozenset(positions)
 
     def search_static_data(self, query: str) -> str:
         """Search through static knowledge base"""
         query_lower = query.lower()
-        relevant_info = []
+        terms = [term for term in query_lower.split()
+                 if len(term) >= STATIC_SEARCH_MIN_TERM_LENGTH and term not in STATIC_SEARCH_STOPWORDS]
+        if not terms:
+            return ""
+
+        matches = set()
+        for term in terms:
+            matches |= self._match_static_term(term)
 
-        for category, items in self.static_data.items():
-            for key, value in items.items():
-                if any(term in key.lower() or term in str(value).lower()
-                       for term in query_lower.split()):
-                    if isinstance(value, dict):
-                        relevant_info.append(f"{key}: {json.dumps(value, ensure_ascii=False)}")
-                    else:
-                        relevant_info.append(f"{key}: {value}")
+        # Keep to the categories the query hints at, unless that would leave nothing
+        hinted = {category for hint, category in STATIC_CATEGORY_HINTS.items() if hint in query_lower}
+        if hinted:
+            scoped = set()
+            for category in hinted:
+                scoped |= matches & self._static_category_positions[category]
+            if scoped:
+                matches = scoped
+
+        relevant_info = [self._static_lines[position] for position in sorted(matches)[:STATIC_SEARCH_MAX_RESULTS]]
 
         return "\n".join(relevant_info) if relevant_info else ""
 
     def search_documents(self, query: str, max_results: int = 5) -> str:
-        """Search through uploaded documents"""
+        """Search through uploaded documents, reusing recent results until the files change"""
+        query = " ".join(query.split())
         try:
-            search_results = self.file_manager.search_files(query)
-            if not search_results:
-                return ""
+            cache_key = (self.file_manager.get_files_version(), query, max_results)
+            cached = self._document_search_cache.get(cache_key)
+            if cached is not None:
+                logger.debug(f"Document search cache hit: {query!r}")
+                return cached
+
+            logger.debug(f"Document search cache miss: {query!r}")
+            result = self._search_documents(query, max_results)
+        except Exception as e:
+            # Failures aren't cached, the next request retries
+            logger.error(f"Error searching documents: {e}")
+            return ""
+
+        self._document_search_cache.put(cache_key, result)
+        return result
+
+    def _search_documents(self, query: str, max_results: int) -> str:
+        """Run a document search and format the results"""
+        search_results = self.file_manager.search_files(query)
+        if not search_results:
+            return ""
 
-            document_info = []
-            for i, result in enumerate(search_results[:max_results]):
-                # Get relevant content from the document
-                file_content = self.file_manager.get_file_content(result['file_id'])
+        search_results = search_results[:max_results]
+        # Content is only needed for hits without a snippet; fetch those in one go
+        contents = self.file_manager.get_file_contents_batch(
+            [result['file_id'] for result in search_results if not result.get('snippet')]
+        )
 
-                doc_info = f"""
+        document_info = []
+        for result in search_results:
+            snippet = result.get('snippet') or contents.get(result['file_id'], {}).get('content', '')[:300]
+
+            doc_info = f"""
 Sənəd: {result['filename']} (Növ: {result['file_type']})
 Kateqoriya: {result.get('category', 'Təyin edilməyib')}
 Təsvir: {result.get('description', 'Təsvir yoxdur')}
-Əlaqəli məzmun: {result.get('snippet', file_content.get('content', '')[:300])}...
+Əlaqəli məzmun: {snippet}...
 """
-                document_info.append(doc_info)
+            document_info.append(doc_info)
 
-            return "\n".join(document_info)
-        except Exception as e:
-            logger.error(f"Error searching documents: {e}")
-            return ""
+        return "\n".join(document_info)
 
     def search(self, query: str) -> str:
         """Enhanced search that combines static data and document search"""
@@ -159,25 +322,80 @@ Təsvir: {result.get('description', 'Təsvir yoxdur')}
     def get_document_by_name(self, filename: str) -> dict:
         """Get specific document by filename"""
         try:
-            files = self.file_manager.list_files()
-            for file_info in files:
-                if filename.lower() in file_info['filename'].lower():
-                    return self.file_manager.get_file_content(file_info['file_id'])
+            matches = self.file_manager.find_by_filename(filename)
+            if matches:
+                return self.file_manager.get_file_content(matches[0]['file_id'])
             return {'error': 'Sənəd tapılmadı'}
         except Exception as e:
             logger.error(f"Error getting document: {e}")
             return {'error': str(e)}
 
 
+# scrypt parameters for stored passwords (16 MB of memory per hash)
+PASSWORD_SCRYPT_N = 2 ** 14
+PASSWORD_SCRYPT_R = 8
+PASSWORD_SCRYPT_P = 1
+PASSWORD_SALT_BYTES = 16
+PASSWORD_HASH_PREFIX = 'scrypt$'
+
+_SQL_USER_BY_NAME = 'SELECT id, username, name, role, password_hash FROM users WHERE username = ?'
+_SQL_INSERT_USER_IF_NEW = 'INSERT OR IGNORE INTO users (username, password_hash, name, role) VALUES (?, ?, ?, ?)'
+
+
+def _scrypt(password: str, salt: bytes) -> bytes:
+    return hashlib.scrypt(password.encode(), salt=salt, n=PASSWORD_SCRYPT_N,
+                          r=PASSWORD_SCRYPT_R, p=PASSWORD_SCRYPT_P, dklen=32)
+
+
+def hash_password(password: str) -> str:
+    """Salted scrypt hash, stored as 'scrypt$<salt hex>$<hash hex>'"""
+    salt = secrets.token_bytes(PASSWORD_SALT_BYTES)
+    return f"{PASSWORD_HASH_PREFIX}{salt.hex()}${_scrypt(password, salt).hex()}"
+
+
+def hash_passwords(passwords) -> list:
+    """hash_password for several passwords at once; scrypt releases the GIL, so threads hash in parallel"""
+    passwords = list(passwords)
+    workers = min(len(passwords), os.cpu_count() or 1)
+    if workers < 2:
+        return [hash_password(password) for password in passwords]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(hash_password, passwords))
+
+
+def verify_password(password: str, stored_hash: str) -> bool:
+    """Constant-time check of a password against a scrypt hash or a legacy unsalted SHA-256 hex digest"""
+    if stored_hash.startswith(PASSWORD_HASH_PREFIX):
+        salt_hex, _, hash_hex = stored_hash[len(PASSWORD_HASH_PREFIX):].partition('$')
+        return hmac.compare_digest(_scrypt(password, bytes.fromhex(salt_hex)).hex(), hash_hex)
+    return hmac.compare_digest(hashlib.sha256(password.encode()).hexdigest(), stored_hash)
+
+
 class UserManager:
     """User management remains the same"""
 
-    def __init__(self):
+    # Seconds a user record stays in the cache between logins
+    USER_CACHE_TTL = 60
+
+    # Applied once to the shared connection; WAL keeps other processes' logins from blocking on a write
+    DB_PRAGMAS = (
+        'PRAGMA journal_mode=WAL',
+        'PRAGMA synchronous=NORMAL',
+        'PRAGMA cache_size=-2000',
+    )
+
+    def __init__(self, cache=None):
+        self.cache = cache  # Optional Redis client
+        # One connection for the process; sqlite3 connections aren't safe for concurrent use, hence the lock
+        self._conn = sqlite3.connect('users.db', check_same_thread=False)
+        self._lock = threading.Lock()
+        for pragma in self.DB_PRAGMAS:
+            self._conn.execute(pragma)
         self.init_db()
         self.add_demo_users()
 
     def init_db(self):
-        conn = sqlite3.connect('users.db')
+        conn = self._conn
         cursor = conn.cursor()
         cursor.execute('''
                        CREATE TABLE IF NOT EXISTS users
@@ -211,7 +429,6 @@ class UserManager:
                        )
                        ''')
         conn.commit()
-        conn.close()
 
     def add_demo_users(self):
         demo_users = [
@@ -220,58 +437,158 @@ class UserManager:
             ('analitik', 'data123', 'Leyla Həsənova', 'analyst')
         ]
 
-        conn = sqlite3.connect('users.db')
-        cursor = conn.cursor()
+        with self._lock:
+            placeholders = ','.join('?' * len(demo_users))
+            existing = {row[0] for row in self._conn.execute(
+                f'SELECT username FROM users WHERE username IN ({placeholders})',
+                [user[0] for user in demo_users]
+            )}
+            missing = [user for user in demo_users if user[0] not in existing]
+            # Usual case after the first start: nothing to hash or write
+            if not missing:
+                return
+
+            password_hashes = hash_passwords(user[1] for user in missing)
+            self._conn.executemany(_SQL_INSERT_USER_IF_NEW, [
+                (username, password_hash, name, role)
+                for (username, _, name, role), password_hash in zip(missing, password_hashes)
+            ])
+            self._conn.commit()
+
+    def get_user_record(self, username):
+        """Fetch a user row by username, served from the cache when possible"""
+        cache_key = f"users:{username}"
+        if self.cache is not None:
+            cached = self.cache.get(cache_key)
+            if cached:
+                return json.loads(cached)
+
+        with self._lock:
+            user = self._conn.execute(_SQL_USER_BY_NAME, (username,)).fetchone()
+
+        if not user:
+            return None
+
+        record = {
+            'id': user[0],
+            'username': user[1],
+            'name': user[2],
+            'role': user[3],
+            'password_hash': user[4]
+        }
+        if self.cache is not None:
+            self.cache.setex(cache_key, self.USER_CACHE_TTL, json.dumps(record, ensure_ascii=False))
+        return record
 
-        for username, password, name, role in demo_users:
-            password_hash = hashlib.sha256(password.encode()).hexdigest()
-            cursor.execute('''
-                           INSERT
-                           OR IGNORE INTO users (username, password_hash, name, role)
-                VALUES (?, ?, ?, ?)
-                           ''', (username, password_hash, name, role))
+    def authenticate(self, username, password):
+        record = self.get_user_record(username)
+        if not record:
+            return None
 
-        conn.commit()
-        conn.close()
+        if not verify_password(password, record['password_hash']):
+            return None
 
-    def authenticate(self, username, password):
-        password_hash = hashlib.sha256(password.encode()).hexdigest()
-        conn = sqlite3.connect('users.db')
-        cursor = conn.cursor()
-        cursor.execute('''
-                       SELECT id, username, name, role
-                       FROM users
-                       WHERE username = ?
-                         AND password_hash = ?
-                       ''', (username, password_hash))
-        user = cursor.fetchone()
-        conn.close()
-
-        if user:
-            return {
-                'id': user[0],
-                'username': user[1],
-                'name': user[2],
-                'role': user[3]
-            }
-        return None
+        if not record['password_hash'].startswith(PASSWORD_HASH_PREFIX):
+            self.upgrade_password_hash(record['username'], password)
+
+        return {
+            'id': record['id'],
+            'username': record['username'],
+            'name': record['name'],
+            'role': record['role']
+        }
+
+    def upgrade_password_hash(self, username, password):
+        """Replace a legacy SHA-256 hash with a scrypt one after a successful login"""
+        with self._lock:
+            self._conn.execute('UPDATE users SET password_hash = ? WHERE username = ?',
+                               (hash_password(password), username))
+            self._conn.commit()
+        if self.cache is not None:
+            self.cache.delete(f"users:{username}")
 
     def create_user(self, username, password, name, role):
-        password_hash = hashlib.sha256(password.encode()).hexdigest()
-        conn = sqlite3.connect('users.db')
-        cursor = conn.cursor()
+        password_hash = hash_password(password)
+
+        with self._lock:
+            try:
+                self._conn.execute('''
+                                   INSERT INTO users (username, password_hash, name, role)
+                                   VALUES (?, ?, ?, ?)
+                                   ''', (username, password_hash, name, role))
+                self._conn.commit()
+                return True
+            except sqlite3.IntegrityError:
+                self._conn.rollback()
+                return False
+
+    def create_users_bulk(self, users):
+        """Create (username, password, name, role) users in one transaction; returns whether each was created"""
+        users = list(users)
+        password_hashes = hash_passwords(user[1] for user in users)
+        rows = [(username, password_hash, name, role)
+                for (username, _, name, role), password_hash in zip(users, password_hashes)]
+
+        with self._lock:
+            try:
+                # Take the write lock once for the whole batch
+                self._conn.execute('BEGIN IMMEDIATE')
+                # Row by row so each result is known; existing usernames (and repeats in the batch) are skipped
+                created = [self._conn.execute(_SQL_INSERT_USER_IF_NEW, row).rowcount == 1 for row in rows]
+                self._conn.commit()
+            except Exception:
+                self._conn.rollback()
+                raise
+        return created
+
+
+# Words in a chat message that point at a kind of document, in the order types are reported
+DOCUMENT_KEYWORDS = {
+    'sənəd': 'document',
+    'fayl': 'file',
+    'pdf': 'pdf',
+    'ərizə': 'application',
+    'nümunə': 'template',
+    'şablon': 'template',
+    'layihə': 'project',
+    'hesabat': 'report',
+    'təlimat': 'instruction'
+}
+# Matched in a lookahead so keywords that overlap in the text are all found in one pass
+_DOCUMENT_KEYWORD_RE = re.compile('(?=(' + '|'.join(map(re.escape, DOCUMENT_KEYWORDS)) + '))')
+
+# Caps on the context pieces that go into a chat prompt, in characters
+MAX_CONTEXT_INFO_CHARS = 3000
+MAX_CONVERSATION_CONTEXT_CHARS = 1200
+MAX_DOCUMENT_CONTENT_CHARS = 2000
+
+# Fixed parts of the chat prompt, identical for every user and turn
+_PROMPT_HEADER = """
+Sən Azərbaycan Respublikası nazirlik işçiləri üçün AI onboarding asistantısan.
 
-        try:
-            cursor.execute('''
-                           INSERT INTO users (username, password_hash, name, role)
-                           VALUES (?, ?, ?, ?)
-                           ''', (username, password_hash, name, role))
-            conn.commit()
-            return True
-        except sqlite3.IntegrityError:
-            return False
-        finally:
-            conn.close()
+👤 İSTİFADƏÇİ MƏLUMATLARI:
+"""
+_PROMPT_RULES = """
+
+📋 CAVAB QAYDLARI:
+1. YALNIZ Azərbaycan dilində cavab ver
+2. Rəsmi lakin dostcasına ton istifadə et
+3. Əgər konkret sənəd və ya əlaqə məlumatı varsa, mutləq qeyd et
+4. Əgər məlumat yoxdursa, hansı şəxslə əlaqə saxlamaq lazım olduğunu bildir
+5. Layihə statusu soruşulursa, həm son statusu həm də son sənədi qeyd et
+6. Sənəd nümunəsi istənilsə, tam şablonu göstər
+7. Böyük sənədlərdən məlumat istənilsə, əsas nöqtələri ümumiləşdir
+8. Əlaqə məlumatlarını (email və telefon) daxil et
+9. Əgər əvvəlki sualla əlaqəli follow-up sualıdırsa, konteksti nəzərə al
+10. Sənəd axtarışı tələb olunursa, uyğun fayl adlarını təklif et
+
+CAVAB (2-6 cümlə):"""
+
+# Shown instead of an answer when Gemini fails
+AI_ERROR_MESSAGE = "Üzr istəyirəm, hazırda texniki problem var. Zəhmət olmasa sonra yenidən cəhd edin."
+
+# File names with a supported extension mentioned in a chat message
+_FILENAME_RE = re.compile(r'([a-zA-Z0-9_-]+\.(?:pdf|docx|xlsx|txt|md))', re.IGNORECASE)
 
 
 class EnhancedAIAssistant:
@@ -303,26 +620,21 @@ class EnhancedAIAssistant:
 
     def maintain_conversation_context(self, user_id: str, message: str, response: str):
         """Maintain conversation context for better follow-up questions"""
-        if user_id not in self.conversation_history:
-            self.conversation_history[user_id] = []
-
-        self.conversation_history[user_id].append({
+        # Keep only last 5 interactions to manage memory; the deque drops older ones itself
+        self.conversation_history.setdefault(user_id, deque(maxlen=5)).append({
             'user_message': message,
             'ai_response': response,
-            'timestamp': datetime.now().isoformat()
+            'timestamp': time.time()
         })
 
-        # Keep only last 5 interactions to manage memory
-        if len(self.conversation_history[user_id]) > 5:
-            self.conversation_history[user_id] = self.conversation_history[user_id][-5:]
-
     def get_conversation_context(self, user_id: str) -> str:
         """Get recent conversation context"""
         if user_id not in self.conversation_history:
             return ""
 
+        history = self.conversation_history[user_id]
         context_parts = []
-        for interaction in self.conversation_history[user_id][-3:]:  # Last 3 interactions
+        for interaction in islice(history, max(0, len(history) - 3), None):  # Last 3 interactions
             context_parts.append(f"İstifadəçi: {interaction['user_message']}")
             context_parts.append(f"AI: {interaction['ai_response'][:200]}...")
 
@@ -330,24 +642,8 @@ class EnhancedAIAssistant:
 
     def detect_document_request(self, message: str) -> dict:
         """Detect if user is asking for a specific document"""
-        document_keywords = {
-            'sənəd': 'document',
-            'fayl': 'file',
-            'pdf': 'pdf',
-            'ərizə': 'application',
-            'nümunə': 'template',
-            'şablon': 'template',
-            'layihə': 'project',
-            'hesabat': 'report',
-            'təlimat': 'instruction'
-        }
-
-        message_lower = message.lower()
-        detected_types = []
-
-        for keyword, doc_type in document_keywords.items():
-            if keyword in message_lower:
-                detected_types.append(doc_type)
+        found = set(_DOCUMENT_KEYWORD_RE.findall(message.lower()))
+        detected_types = [doc_type for keyword, doc_type in DOCUMENT_KEYWORDS.items() if keyword in found]
 
         return {
             'has_document_request': len(detected_types) > 0,
@@ -358,39 +654,34 @@ class EnhancedAIAssistant:
     def extract_filename_from_message(self, message: str) -> str:
         """Try to extract specific filename from user message"""
         # Look for common file extensions
-        import re
-        pattern = r'([a-zA-Z0-9_-]+\.(pdf|docx|xlsx|txt|md))'
-        match = re.search(pattern, message, re.IGNORECASE)
+        match = _FILENAME_RE.search(message)
         return match.group(1) if match else ""
 
-    def generate_enhanced_response(self, user_message: str, user_info: dict) -> str:
-        """Enhanced response generation with better context and document handling"""
-        try:
-            user_id = str(user_info['id'])
-
-            # Get conversation context
-            conversation_context = self.get_conversation_context(user_id)
+    def _build_prompt(self, user_message: str, user_info: dict):
+        """User id and full Gemini prompt for a chat turn"""
+        user_id = str(user_info['id'])
 
-            # Detect document requests
-            doc_request = self.detect_document_request(user_message)
+        # Get conversation context
+        conversation_context = self.get_conversation_context(user_id)[:MAX_CONVERSATION_CONTEXT_CHARS]
 
-            # Get context information from knowledge base
-            role_context = self.get_role_context(user_info['role'])
-            context_info = self.kb.search(user_message)
+        # Detect document requests
+        doc_request = self.detect_document_request(user_message)
 
-            # Handle specific document requests
-            document_content = ""
-            if doc_request['has_document_request'] and doc_request['specific_filename']:
-                doc_result = self.kb.get_document_by_name(doc_request['specific_filename'])
-                if not doc_result.get('error'):
-                    document_content = f"\n=== XÜSUSI SƏNƏD MƏZMUNU ===\n{doc_result.get('content', '')[:2000]}..."
+        # Get context information from knowledge base
+        role_context = self.get_role_context(user_info['role'])
+        context_info = self.kb.search(user_message)[:MAX_CONTEXT_INFO_CHARS]
 
-            # Create enhanced prompt with better structure
-            system_prompt = f"""
-Sən Azərbaycan Respublikası nazirlik işçiləri üçün AI onboarding asistantısan.
+        # Handle specific document requests
+        document_content = ""
+        if doc_request['has_document_request'] and doc_request['specific_filename']:
+            doc_result = self.kb.get_document_by_name(doc_request['specific_filename'])
+            if not doc_result.get('error'):
+                document_content = f"\n=== XÜSUSI SƏNƏD MƏZMUNU ===\n{doc_result.get('content', '')[:MAX_DOCUMENT_CONTENT_CHARS]}..."
 
-👤 İSTİFADƏÇİ MƏLUMATLARI:
-- Ad: {user_info['name']}
+        # Create enhanced prompt with better structure
+        return user_id, "".join([
+            _PROMPT_HEADER,
+            f"""- Ad: {user_info['name']}
 - Rol: {self.get_role_display_name(user_info['role'])}
 - İstifadəçi adı: {user_info['username']}
 
@@ -405,33 +696,33 @@ Sən Azərbaycan Respublikası nazirlik işçiləri üçün AI onboarding asista
 
 {document_content}
 
-❓ YENİ SUAL: "{user_message}"
-
-📋 CAVAB QAYDLARI:
-1. YALNIZ Azərbaycan dilində cavab ver
-2. Rəsmi lakin dostcasına ton istifadə et
-3. Əgər konkret sənəd və ya əlaqə məlumatı varsa, mutləq qeyd et
-4. Əgər məlumat yoxdursa, hansı şəxslə əlaqə saxlamaq lazım olduğunu bildir
-5. Layihə statusu soruşulursa, həm son statusu həm də son sənədi qeyd et
-6. Sənəd nümunəsi istənilsə, tam şablonu göstər
-7. Böyük sənədlərdən məlumat istənilsə, əsas nöqtələri ümumiləşdir
-8. Əlaqə məlumatlarını (email və telefon) daxil et
-9. Əgər əvvəlki sualla əlaqəli follow-up sualıdırsa, konteksti nəzərə al
-10. Sənəd axtarışı tələb olunursa, uyğun fayl adlarını təklif et
+❓ YENİ SUAL: "{user_message}\"""",
+            _PROMPT_RULES,
+        ])
+
+    def _generation_config(self):
+        """Sampling settings shared by the streaming and non-streaming calls"""
+        return genai.types.GenerationConfig(
+            temperature=0.7,
+            top_k=40,
+            top_p=0.95,
+            max_output_tokens=1024,
+        )
+
+    @staticmethod
+    def _chunk_text(chunk) -> str:
+        """Text of a streamed chunk; chunks without text parts (e.g. only finish metadata) give ''"""
+        if not chunk.candidates:
+            return ""
+        return "".join(part.text for part in chunk.candidates[0].content.parts if "text" in part)
 
-CAVAB (2-6 cümlə):"""
+    def generate_enhanced_response(self, user_message: str, user_info: dict) -> str:
+        """Enhanced response generation with better context and document handling"""
+        try:
+            user_id, system_prompt = self._build_prompt(user_message, user_info)
 
             # Generate response using Gemini
-            response = self.model.generate_content(
-                system_prompt,
-                generation_config=genai.types.GenerationConfig(
-                    temperature=0.7,
-                    top_k=40,
-                    top_p=0.95,
-                    max_output_tokens=1024,
-                )
-            )
-
+            response = self.model.generate_content(system_prompt, generation_config=self._generation_config())
             response_text = response.text
 
             # Maintain conversation context
@@ -441,7 +732,35 @@ CAVAB (2-6 cümlə):"""
 
         except Exception as e:
             logger.error(f"AI Error: {e}")
-            return "Üzr istəyirəm, hazırda texniki problem var. Zəhmət olmasa sonra yenidən cəhd edin."
+            return AI_ERROR_MESSAGE
+
+    def generate_enhanced_response_stream(self, user_message: str, user_info: dict):
+        """Yield the response text as Gemini produces it; the turn is remembered once the stream completes"""
+        parts = []
+        try:
+            user_id, system_prompt = self._build_prompt(user_message, user_info)
+
+            # Streamed so the first words reach the user early
+            response = self.model.generate_content(
+                system_prompt, stream=True, generation_config=self._generation_config()
+            )
+
+            for chunk in response:
+                text = self._chunk_text(chunk)
+                if text:
+                    parts.append(text)
+                    yield text
+
+            # Maintain conversation context
+            self.maintain_conversation_context(user_id, user_message, "".join(parts))
+
+        except Exception as e:
+            if parts:
+                logger.error(f"AI Error: response cut off after {sum(map(len, parts))} characters: {e}")
+                yield "\n\n" + AI_ERROR_MESSAGE
+            else:
+                logger.error(f"AI Error: {e}")
+                yield AI_ERROR_MESSAGE
 
     def generate_response(self, user_message: str, user_info: dict) -> str:
         """Wrapper method for backward compatibility"""
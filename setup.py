@@ -77,7 +77,7 @@ def test_imports():
         'PyPDF2',
         'docx',
         'openpyxl',
-        'bs4',
+        'lxml',
         'markdown'
     ]
 
@@ -0,0 +1,35 @@
+"""
+Background jobs for the upload queue.
+
+Run a worker next to the web app with:
+
+    rq worker uploads --url $REDIS_URL --worker-class rq.SimpleWorker
+
+The default rq Worker forks a fresh work horse for every job, so nothing
+cached here would outlive the job; SimpleWorker runs jobs in the worker
+process itself and keeps one FileManager (pool, text cache) across jobs.
+"""
+from typing import Dict, List
+
+from file_manager import FileManager
+
+_file_manager = None
+
+
+def get_file_manager() -> FileManager:
+    """File manager for this process; reused across jobs only under SimpleWorker"""
+    global _file_manager
+    if _file_manager is None:
+        _file_manager = FileManager()
+    return _file_manager
+
+
+def process_upload(stored: Dict, category: str = None, tags: List[str] = None,
+                   description: str = None) -> Dict:
+    """Extract, chunk and index a file the web app already wrote to storage"""
+    return get_file_manager().index_stored_file(stored, category, tags, description)
+
+
+def process_bulk_upload(directory_path: str, category: str = None) -> Dict:
+    """Upload every supported file in a directory"""
+    return get_file_manager().bulk_upload(directory_path, category)